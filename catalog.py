@@ -0,0 +1,163 @@
+"""
+Concept and problem catalog: DTOs serialized once per ontology version into
+response bodies with strong ETags and precompressed variants, column tables
+for projected/paged listings, and the HTTP validators they are served with.
+"""
+import base64
+import gzip
+import hashlib
+import json
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+try:
+    import orjson
+except ImportError:  # optional: responses are encoded with the json module instead
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional: catalog responses are precompressed with gzip only
+    brotli = None
+
+# Content codings in order of preference (smallest first)
+CONTENT_CODINGS = ["br", "gzip"] if brotli is not None else ["gzip"]
+
+def json_bytes(content) -> bytes:
+    """
+    Serialize exactly as Starlette's JSONResponse does: compact separators,
+    UTF-8, no ASCII escaping. orjson produces the same bytes for everything
+    this API returns; values it cannot encode go through the json module.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(content)
+        except TypeError:
+            pass
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(",", ":")).encode("utf-8")
+
+class StaticBody:
+    """
+    A serialized response body, its strong ETag (prefixed with the ontology
+    `version`) and precompressed variants (coding -> (bytes, ETag)); bodies
+    that do not shrink keep no variants.
+    """
+
+    def __init__(self, body: bytes, version: str):
+        self.body = body
+        self.etag = f'"{version}-{hashlib.sha256(body).hexdigest()[:16]}"'
+        self.variants: Dict[str, Tuple[bytes, str]] = {}
+        for coding in CONTENT_CODINGS:
+            packed = brotli.compress(body) if coding == "br" else gzip.compress(body, compresslevel=9, mtime=0)
+            if len(packed) < len(body):
+                # Each representation needs its own strong validator
+                self.variants[coding] = (packed, f'{self.etag[:-1]}-{coding}"')
+
+class ColumnTable:
+    """
+    DTO rows stored column-wise, each cell pre-serialized as its `"key":value`
+    fragment, so any projection of any rows is spliced without encoding.
+    """
+
+    def __init__(self, rows: List[dict]):
+        self.fields = list(rows[0]) if rows else []
+        self.columns = {f: [json_bytes(f) + b":" + json_bytes(r[f]) for r in rows] for f in self.fields}
+
+    def project(self, fields: Optional[str]) -> List[str]:
+        """Requested fields in DTO order; all of them when `fields` is None."""
+        if fields is None:
+            return self.fields
+        wanted = {f.strip() for f in fields.split(",") if f.strip()}
+        if not wanted:
+            raise HTTPException(status_code=400, detail=f"No fields requested; available: {self.fields}")
+        unknown = wanted.difference(self.fields)
+        if unknown and self.fields:
+            raise HTTPException(status_code=400,
+                                detail=f"Unknown fields: {sorted(unknown)}; available: {self.fields}")
+        return [f for f in self.fields if f in wanted]
+
+    def render(self, ids: Iterable[int], fields: List[str]) -> bytes:
+        cols = [self.columns[f] for f in fields]
+        return b"[" + b",".join(b"{" + b",".join(col[i] for col in cols) + b"}" for i in ids) + b"]"
+
+class Catalog:
+    """
+    Concept and problem DTOs and their serialized response bodies for one
+    ontology `version`; built when the ontology is loaded and read-only
+    afterwards.
+    """
+
+    def __init__(self, concepts: List[dict], problems: List[dict], version: str):
+        self.version = version
+        self.concepts = concepts
+        self.by_iri = {d["iri"]: d for d in self.concepts}
+        self.by_code = {d["code"]: d for d in self.concepts if d["code"]}
+        self.concepts_body = StaticBody(json_bytes(self.concepts), version)
+        self.concept_bodies = {code: StaticBody(json_bytes(d), version) for code, d in self.by_code.items()}
+        self.concept_table = ColumnTable(self.concepts)
+
+        # Problems are addressed by position; each is serialized once and the
+        # per-concept lists are spliced from the pieces
+        self.problems = problems
+        self.problem_bodies = [json_bytes(d) for d in self.problems]
+        self.problems_by_concept: Dict[str, List[int]] = defaultdict(list)
+        for i, d in enumerate(self.problems):
+            if d["concept_code"] is not None:
+                self.problems_by_concept[d["concept_code"]].append(i)
+        self.problems_body = StaticBody(self.problems_json(range(len(self.problems))), version)
+        self.concept_problems_bodies = {
+            code: StaticBody(self.problems_json(ids), version) for code, ids in self.problems_by_concept.items()
+        }
+        self.no_problems_body = StaticBody(b"[]", version)
+        self.problem_table = ColumnTable(self.problems)
+
+    def problems_json(self, ids: Iterable[int]) -> bytes:
+        return b"[" + b",".join(self.problem_bodies[i] for i in ids) + b"]"
+
+    def encode_cursor(self, scope: str, offset: int) -> str:
+        raw = f"{self.version}:{offset}:{scope}".encode("utf-8")
+        return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+    def decode_cursor(self, cursor: str, scope: str) -> int:
+        """Offset stored in `cursor`; 400 if it is malformed, for another listing or another ontology version."""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+            version, offset, cursor_scope = raw.split(":", 2)
+            if version == self.version and cursor_scope == scope and int(offset) >= 0:
+                return int(offset)
+        except ValueError:
+            pass
+        raise HTTPException(status_code=400, detail="Invalid or expired cursor")
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match evaluation (weak comparison, as RFC 9110 requires for it)."""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+def accepted_coding(accept_encoding: Optional[str], available: Iterable[str]) -> Optional[str]:
+    """The preferred available content coding the client accepts (q > 0), None for identity."""
+    if not accept_encoding:
+        return None
+    q: Dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        q[coding.strip()] = weight
+    for coding in available:
+        if q.get(coding, q.get("*", 0.0)) > 0:
+            return coding
+    return None
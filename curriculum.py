@@ -0,0 +1,271 @@
+"""
+The hasPrerequisite graph over interned concept ids, with precomputed
+transitive closures, and the cost-aware curriculum planner built on it.
+"""
+import heapq
+from array import array
+from typing import Dict, Iterable, List, Tuple
+
+from catalog import Catalog
+
+class PrerequisiteGraph:
+    """
+    hasPrerequisite over interned concept ids: concept codes are numbered in
+    catalog order and edges are kept in CSR form, i.e. the prerequisites of
+    concept i are prereq_idx[prereq_off[i]:prereq_off[i + 1]] (dependents
+    likewise in the reverse arrays). Transitive closures are precomputed as
+    bitsets (Python ints, bit j = concept j): ancestors[i] holds everything
+    i needs, descendants[i] everything that needs i.
+    """
+
+    def __init__(self, cat: Catalog):
+        self.codes = list(cat.by_code)
+        self.ids = {code: i for i, code in enumerate(self.codes)}
+        edges = [
+            [self.ids[p] for p in dict.fromkeys(cat.by_code[code]["prerequisites"]) if p in self.ids]
+            for code in self.codes
+        ]
+        self.prereq_off, self.prereq_idx = self._csr(edges)
+        reverse: List[List[int]] = [[] for _ in self.codes]
+        for i, targets in enumerate(edges):
+            for j in targets:
+                reverse[j].append(i)
+        self.dep_off, self.dep_idx = self._csr(reverse)
+        self._build_closures()
+
+    @staticmethod
+    def _csr(adjacency: List[List[int]]) -> Tuple[array, array]:
+        off, idx = array("I", [0]), array("I")
+        for targets in adjacency:
+            idx.extend(targets)
+            off.append(len(idx))
+        return off, idx
+
+    def _components(self) -> List[List[int]]:
+        """
+        Strongly connected components of the prerequisite edges (Tarjan,
+        iterative), prerequisites' components first; on a DAG all singletons.
+        """
+        n = len(self.codes)
+        off, idx = self.prereq_off, self.prereq_idx
+        index, low = [-1] * n, [0] * n
+        on_stack = bytearray(n)
+        stack: List[int] = []
+        components: List[List[int]] = []
+        counter = 0
+        for root in range(n):
+            if index[root] >= 0:
+                continue
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = 1
+            work = [(root, off[root])]
+            while work:
+                v, k = work[-1]
+                if k < off[v + 1]:
+                    work[-1] = (v, k + 1)
+                    w = idx[k]
+                    if index[w] < 0:
+                        index[w] = low[w] = counter
+                        counter += 1
+                        stack.append(w)
+                        on_stack[w] = 1
+                        work.append((w, off[w]))
+                    elif on_stack[w]:
+                        low[v] = min(low[v], index[w])
+                    continue
+                work.pop()
+                if work:
+                    u = work[-1][0]
+                    low[u] = min(low[u], low[v])
+                if low[v] == index[v]:
+                    component = []
+                    while True:
+                        w = stack.pop()
+                        on_stack[w] = 0
+                        component.append(w)
+                        if w == v:
+                            break
+                    components.append(component)
+        return components
+
+    def _build_closures(self):
+        n = len(self.codes)
+        components = self._components()
+        # Prerequisites before the concepts that need them (cycles kept together)
+        self.topo_order = [i for component in components for i in component]
+        self.ancestors = [0] * n
+        self.descendants = [0] * n
+        for closure, comps, reverse in ((self.ancestors, components, False),
+                                        (self.descendants, components[::-1], True)):
+            for component in comps:
+                # Edges inside a cycle make every member its own ancestor, as they should
+                mask = 0
+                for i in component:
+                    for j in self.neighbours(i, reverse):
+                        mask |= closure[j] | (1 << j)
+                for i in component:
+                    closure[i] = mask
+
+    @staticmethod
+    def mask(ids: Iterable[int]) -> int:
+        m = 0
+        for i in ids:
+            m |= 1 << i
+        return m
+
+    @staticmethod
+    def bit_ids(mask: int) -> List[int]:
+        """Set bit positions of `mask`, ascending."""
+        bits = bin(mask)[:1:-1]
+        out, i = [], bits.find("1")
+        while i >= 0:
+            out.append(i)
+            i = bits.find("1", i + 1)
+        return out
+
+    def known_mask(self, codes: Iterable[str]) -> int:
+        return self.mask(self.ids[c] for c in codes if c in self.ids)
+
+    def missing_closure(self, target: int, known: int) -> int:
+        """
+        Bitset of `target` and the prerequisites still to learn for it. A known
+        concept counts as knowing its own prerequisites, so everything below it
+        is covered too.
+        """
+        covered = known
+        for k in self.bit_ids(known & (self.ancestors[target] | (1 << target))):
+            covered |= self.ancestors[k]
+        return (self.ancestors[target] | (1 << target)) & ~covered
+
+    def missing_prerequisites(self, target: str, known: Iterable[str]) -> List[str]:
+        """Everything `target` still needs given `known`, in catalog order."""
+        i = self.ids[target]
+        needed = self.missing_closure(i, self.known_mask(known)) & ~(1 << i)
+        return [self.codes[j] for j in self.bit_ids(needed)]
+
+    def layers(self, target: str, known: Iterable[str]) -> List[List[int]]:
+        """
+        The target plus the prerequisites still missing for it (see
+        missing_closure), in topological layers: a concept sits one layer
+        after the latest of its missing prerequisites.
+        """
+        needed = self.missing_closure(self.ids[target], self.known_mask(known))
+        if not needed:
+            return []
+        layer: Dict[int, int] = {}
+        for k in self.topo_order:
+            if needed >> k & 1:
+                # members of a prerequisite cycle that are not placed yet are skipped
+                layer[k] = 1 + max((layer[p] for p in self.neighbours(k) if p in layer), default=-1)
+        out: List[List[int]] = [[] for _ in range(max(layer.values()) + 1)]
+        for k, n in layer.items():
+            out[n].append(k)
+        return out
+
+    def neighbours(self, i: int, reverse: bool = False) -> array:
+        off, idx = (self.dep_off, self.dep_idx) if reverse else (self.prereq_off, self.prereq_idx)
+        return idx[off[i]:off[i + 1]]
+
+    def related(self, code: str, reverse: bool, transitive: bool) -> List[str]:
+        i = self.ids[code]
+        if transitive:
+            ids = self.bit_ids(self.descendants[i] if reverse else self.ancestors[i])
+        else:
+            ids = sorted(self.neighbours(i, reverse))
+        return [self.codes[j] for j in ids]
+
+class CurriculumPlanner:
+    """
+    Cost-aware plans over the interned prerequisite graph. Every concept in
+    the target's missing closure has to be learned, so the plan is that
+    closure with its total cost, in a cheapest-available-first order, plus
+    the critical path: the costliest prerequisite chain ending at the target
+    (a DAG longest path), which bounds the effort however work is split.
+    """
+
+    def __init__(self, graph: PrerequisiteGraph, cat: Catalog, cache, difficulty_weight: float = 1.0,
+                 ks_weight: float = 0.5, no_problem_penalty: float = 2.0):
+        self.graph = graph
+        practised = set(cat.problems_by_concept)
+        self.costs = []
+        for code in graph.codes:
+            d = cat.by_code[code]
+            self.costs.append(
+                difficulty_weight * (d["difficulty"] or 0)
+                + ks_weight * (d["ks_level"] or 0)
+                + (0.0 if code in practised else no_problem_penalty)
+            )
+        # (target, relevant known bitset) -> plan; anything with get/put
+        self.cache = cache
+
+    def relevant_known(self, target: str, known_codes: Iterable[str]) -> int:
+        """The known concepts that matter for `target`, as a bitset (the cache key)."""
+        i = self.graph.ids[target]
+        return (self.graph.ancestors[i] | (1 << i)) & self.graph.known_mask(known_codes)
+
+    def plan(self, target: str, known_codes: Iterable[str]) -> dict:
+        relevant = self.relevant_known(target, known_codes)
+        key = (target, relevant)
+        plan = self.cache.get(key)
+        if plan is None:
+            plan = self._plan(self.graph.ids[target], relevant)
+            self.cache.put(key, plan)
+        return plan
+
+    def _plan(self, target: int, known: int) -> dict:
+        g, costs = self.graph, self.costs
+        needed = g.missing_closure(target, known)
+        members = g.bit_ids(needed)
+
+        # Schedule: Kahn's algorithm over the missing concepts, cheapest first
+        waiting = {i: sum(1 for p in g.neighbours(i) if needed >> p & 1) for i in members}
+        ready = [(costs[i], g.codes[i], i) for i in members if not waiting[i]]
+        heapq.heapify(ready)
+        order: List[int] = []
+        while ready:
+            _, _, i = heapq.heappop(ready)
+            order.append(i)
+            for j in g.neighbours(i, reverse=True):
+                if needed >> j & 1:
+                    waiting[j] -= 1
+                    if not waiting[j]:
+                        heapq.heappush(ready, (costs[j], g.codes[j], j))
+        if len(order) < len(members):  # prerequisite cycle: the rest in graph order
+            placed = set(order)
+            order.extend(i for i in g.topo_order if needed >> i & 1 and i not in placed)
+
+        # Critical path: costliest chain of missing prerequisites into the target
+        best: Dict[int, float] = {}
+        via: Dict[int, int] = {}
+        for i in g.topo_order:
+            if needed >> i & 1:
+                prev = max((p for p in g.neighbours(i) if p in best), key=best.__getitem__, default=None)
+                best[i] = costs[i] + (best[prev] if prev is not None else 0.0)
+                if prev is not None:
+                    via[i] = prev
+        chain: List[int] = []
+        i = target if target in best else None
+        while i is not None:
+            chain.append(i)
+            i = via.get(i)
+
+        return {
+            "target": g.codes[target],
+            "total_cost": round(sum(costs[i] for i in order), 6),
+            "steps": [{"code": g.codes[i], "cost": costs[i]} for i in order],
+            "critical_path": [g.codes[i] for i in reversed(chain)],
+            "critical_cost": round(best.get(target, 0.0), 6),
+        }
+
+    def plan_class(self, target: str, known_by_student: Dict[str, List[str]]) -> Dict[str, dict]:
+        """Plans for many students; students in the same relevant knowledge state share one."""
+        plans: Dict[int, dict] = {}
+        out = {}
+        for sid, known in known_by_student.items():
+            relevant = self.relevant_known(target, known)
+            if relevant not in plans:
+                plans[relevant] = self.plan(target, (self.graph.codes[i] for i in self.graph.bit_ids(relevant)))
+            out[sid] = plans[relevant]
+        return out
@@ -1,9 +1,36 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import hashlib
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from collections import OrderedDict, defaultdict
+
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Set, Tuple, Iterable, Literal
+
+import owlready2
+from owlready2 import (
+    default_world, sync_reasoner, sync_reasoner_pellet, World, destroy_entity, ThingClass, ObjectPropertyClass,
+    IndividualPropertyAtom,
+)
 
-from owlready2 import get_ontology, sync_reasoner
+from catalog import (
+    CONTENT_CODINGS, Catalog, ColumnTable, StaticBody, accepted_coding, etag_matches, json_bytes,
+)
+from curriculum import CurriculumPlanner, PrerequisiteGraph
+from owl_rl import quadstore_facts, rl_profile_violations, rl_schema_rules
+from rule_engine import (
+    CompiledRule, Fact, ReteNetwork, UnsupportedRule, build_engine, is_var,
+)
+from search import SearchIndex
 
 # ----------------------------
 # Configuration
@@ -13,10 +40,74 @@ FRONTEND_ORIGIN = "http://localhost:3000"
 
 ALLOW_ALL_ORIGINS = True  # dev / prototype
 
+# "native": in-process SWRL rule engine for per-student reasoning (no Java)
+# "rl":     in-process OWL 2 RL materializer (subclass/domain/range + SWRL)
+# "hermit" / "pellet": owlready2 sync_reasoner / sync_reasoner_pellet
+REASONER_BACKEND = os.environ.get("ITS_REASONER", "native")
+
+# With "hermit": use the RL materializer instead while the ontology stays
+# inside the OWL 2 RL subset it implements (HermiT otherwise)
+RL_FASTPATH = os.environ.get("ITS_RL_FASTPATH", "1") == "1"
+
+# Latency budget for reasoning on the request path; when it runs out the
+# endpoint answers with the last materialized results marked stale (0 = none).
+# Unset: 0 when an in-process engine does the reasoning, 2000 with a Java
+# reasoner (resolved once the engines are built, see active_backend)
+REASONING_DEADLINE_MS: Optional[float] = (
+    float(os.environ["ITS_REASONING_DEADLINE_MS"]) if "ITS_REASONING_DEADLINE_MS" in os.environ else None)
+REASONER_THREADS = 4
+
+# HermiT input for a single-student request:
+# "student": TBox + concept ABox + only that student's knowsConcept
+# "world":   the whole ontology, every Student_* individual included
+REASONING_SCOPE = os.environ.get("ITS_REASONING_SCOPE", "student")
+
+# Group commit: concurrent /student/update calls arriving within this window
+# share one reasoner run (0 disables batching). Unset: 0 in-process, 5 with Java
+REASONING_BATCH_WINDOW_MS: Optional[float] = (
+    float(os.environ["ITS_BATCH_WINDOW_MS"]) if "ITS_BATCH_WINDOW_MS" in os.environ else None)
+
+# Background executor for /student/update?mode=async reasoning jobs
+REASONING_JOB_WORKERS = int(os.environ.get("ITS_JOB_WORKERS", "2"))
+JOB_RETENTION = 1000       # finished jobs kept for polling
+JOB_MAX_WAIT_S = 30.0      # cap on /jobs/{id}?wait= long-polls
+
+# Classified class hierarchy, computed once per ontology version
+TBOX_SNAPSHOT_PATH = ONTO_PATH + ".tbox.json"
+
+# Cache-Control for catalog responses (/concepts, /concept/{code}, /problems);
+# clients revalidate with If-None-Match and get 304 while the ontology is unchanged
+CATALOG_CACHE_CONTROL = os.environ.get("ITS_CATALOG_CACHE_CONTROL", "public, no-cache")
+
+# Largest ?limit= page for /concepts and /problems
+MAX_PAGE_SIZE = 500
+
+# Max results of /search and /search/suggest
+MAX_SEARCH_RESULTS = 50
+
+# Curriculum planner cost of learning a concept: weighted difficulty and KS
+# level, plus a penalty when no problem in the bank practises it
+PLAN_DIFFICULTY_WEIGHT = 1.0
+PLAN_KS_WEIGHT = 0.5
+PLAN_NO_PROBLEM_PENALTY = 2.0
+
+# Max entries in the (ontology version, known concepts) -> recommendations cache
+RECOMMENDATION_CACHE_SIZE = int(os.environ.get("ITS_RECOMMENDATION_CACHE_SIZE", "1024"))
+
+# ----------------------------
+# JSON encoding
+# ----------------------------
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with json_bytes. Endpoints that build their body from
+    plain dicts return it directly, which also skips FastAPI's jsonable_encoder."""
+
+    def render(self, content) -> bytes:
+        return json_bytes(content)
+
 # ----------------------------
 # FastAPI app + CORS
 # ----------------------------
-app = FastAPI(title="Geometry ITS Backend")
+app = FastAPI(title="Geometry ITS Backend", default_response_class=FastJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -29,27 +120,43 @@ app.add_middleware(
 # ----------------------------
 # Load ontology at startup
 # ----------------------------
-print(f"Loading ontology: {ONTO_PATH}")
-onto = get_ontology(ONTO_PATH).load()
-print("Ontology loaded.")
+def load_ontology(world=default_world):
+    """Load ONTO_PATH into `world` and resolve the core classes and the teacher."""
+    global onto, ONTO_VERSION, GeometricConcept, Problem, StudentModel, VirtualTeacher
+    print(f"Loading ontology: {ONTO_PATH}")
+    loaded = world.get_ontology(ONTO_PATH).load()
+    with open(ONTO_PATH, "rb") as f:
+        version = hashlib.sha256(f.read()).hexdigest()[:16]
 
-# Resolve core classes (must exist in ontology)
-try:
-    GeometricConcept = onto.GeometricConcept
-    Problem = onto.Problem
-    StudentModel = onto.StudentModel
-except Exception as e:
-    raise RuntimeError(
-        "Ontology is missing required classes (GeometricConcept, Problem, StudentModel). "
-        "Check ontology schema."
-    ) from e
-
-# Teacher individual
-VirtualTeacher = onto.search_one(iri="*#VirtualTeacher1")
+    # Resolve core classes (must exist in ontology)
+    try:
+        core = (loaded.GeometricConcept, loaded.Problem, loaded.StudentModel)
+    except Exception as e:
+        raise RuntimeError(
+            "Ontology is missing required classes (GeometricConcept, Problem, StudentModel). "
+            "Check ontology schema."
+        ) from e
+
+    onto, ONTO_VERSION = loaded, version
+    GeometricConcept, Problem, StudentModel = core
+    # Teacher individual
+    VirtualTeacher = onto.search_one(iri="*#VirtualTeacher1")
+    print(f"Ontology loaded (version {ONTO_VERSION}).")
+
+load_ontology()
 
 # In-memory cache for student known concepts (prototype storage)
 student_cache: Dict[str, List[str]] = {}
 
+# ABox generations. Every mutation takes the next world generation and stamps
+# it on the student it touched; reasoning records the generation it covered,
+# so reads can tell whether the current inferences are still valid.
+world_generation = 0
+world_reasoned_generation = -1
+student_generation: Dict[str, int] = {}
+reasoned_generation: Dict[str, int] = {}
+generation_lock = threading.Lock()
+
 # ----------------------------
 # Utilities
 # ----------------------------
@@ -57,9 +164,78 @@ def first_literal(ind, prop: str):
     vals = getattr(ind, prop, [])
     return vals[0] if vals else None
 
-def run_reasoner():
-    """Run OWL+SWRL reasoning."""
-    sync_reasoner(onto, infer_property_values=True)
+def run_reasoner(s_ind=None):
+    """
+    Run OWL+SWRL reasoning with the active backend, for one student or,
+    with s_ind=None, the whole ontology.
+    """
+    global world_reasoned_generation
+    backend = active_backend()
+    with reasoner_lock:
+        world_gen = world_generation
+        gen = student_generation.get(s_ind.iri, 0) if s_ind is not None else 0
+
+        if s_ind is None or backend.whole_world:
+            backend.reason_world()
+            world_reasoned_generation = world_gen
+        else:
+            backend.reason_student(s_ind)
+
+        if s_ind is not None:
+            reasoned_generation[s_ind.iri] = gen
+
+def native_reasoning() -> bool:
+    return isinstance(active_backend(), NativeBackend)
+
+def bump_generation(s_ind) -> int:
+    """Record an ABox change to `s_ind`."""
+    global world_generation
+    with generation_lock:
+        world_generation += 1
+        student_generation[s_ind.iri] = world_generation
+        return world_generation
+
+def inferences_current(s_ind) -> bool:
+    """Whether `s_ind`'s inferences reflect every ABox change they depend on."""
+    if active_backend().whole_world:
+        return world_reasoned_generation == world_generation
+    return reasoned_generation.get(s_ind.iri) == student_generation.get(s_ind.iri, 0)
+
+def reason_batch(students: Iterable[Any]):
+    """Bring several students up to date with as few reasoner runs as possible."""
+    stale = [s for s in dict.fromkeys(students) if not inferences_current(s)]
+    if not stale:
+        return
+    if native_reasoning():
+        # Per-student paths are already cheap and incremental
+        for s in stale:
+            run_reasoner(s)
+    elif REASONING_SCOPE == "student":
+        with reasoner_lock:
+            gens = {s.iri: student_generation.get(s.iri, 0) for s in stale}
+            get_student_module().reason(*stale, sync=active_backend().sync)
+            reasoned_generation.update(gens)
+    else:
+        run_reasoner()
+
+def ensure_reasoned(s_ind, whole_world: bool = False):
+    """
+    Reason only if the ABox changed since the last run. `whole_world` is for
+    inferences about individuals other than the student (e.g. the teacher),
+    which HermiT only produces over all of `onto`.
+    """
+    world = whole_world and not native_reasoning()
+
+    def stale() -> bool:
+        return world_reasoned_generation != world_generation if world else not inferences_current(s_ind)
+
+    if not stale():
+        return
+    with reasoner_lock:
+        # Checked again: calls queued behind a run that covered them (e.g.
+        # repeated /recommend polls past their deadline) have nothing to do
+        if stale():
+            run_reasoner(None if world else s_ind)
 
 def build_concept_index() -> Dict[str, Any]:
     """Build concept_code -> OWL individual index."""
@@ -118,46 +294,140 @@ def problem_to_dict(p) -> dict:
         "concept_code": concept_code,
     }
 
+# ----------------------------
+# Catalog, prerequisite graph and search
+# ----------------------------
+def concept_dto(c) -> dict:
+    """The catalog DTO of concept `c` (built on the fly for one the catalog does not know)."""
+    d = catalog.by_iri.get(c.iri)
+    return d if d is not None else concept_to_dict(c)
+
+def table_response(request: Request, table: ColumnTable, ids: List[int], scope: str, fields: Optional[str],
+                   limit: Optional[int], cursor: Optional[str]) -> Response:
+    """
+    Projected rows of `ids` (in catalog order). With limit/cursor the body is
+    a page: {"items": [...], "next_cursor": str or null}. The body only depends
+    on the ontology version and the normalized query, so that is what the
+    ETag is made of, and a matching If-None-Match is answered before rendering.
+    """
+    cols = table.project(fields)
+    paged = limit is not None or cursor is not None
+    start = catalog.decode_cursor(cursor, scope) if cursor else 0
+    query = f"{scope}|{','.join(cols)}|{start}|{limit if paged else ''}|{paged}"
+    etag = f'"{ONTO_VERSION}-{hashlib.sha256(query.encode("utf-8")).hexdigest()[:16]}"'
+    headers = {"ETag": etag, "Cache-Control": CATALOG_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if not paged:
+        return Response(content=table.render(ids, cols), media_type="application/json", headers=headers)
+    end = min(start + (limit or MAX_PAGE_SIZE), len(ids))
+    next_cursor = catalog.encode_cursor(scope, end) if end < len(ids) else None
+    body = b'{"items":' + table.render(ids[start:end], cols) + b',"next_cursor":' + json_bytes(next_cursor) + b"}"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def static_response(request: Request, item: StaticBody) -> Response:
+    """
+    Catalog body with ETag/Cache-Control in the best precompressed coding the
+    client accepts, or 304 when the client's copy is current.
+    """
+    coding = accepted_coding(request.headers.get("accept-encoding"),
+                             [c for c in CONTENT_CODINGS if c in item.variants])
+    body, etag = item.variants[coding] if coding else (item.body, item.etag)
+    headers = {"ETag": etag, "Cache-Control": CATALOG_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if coding:
+        headers["Content-Encoding"] = coding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def build_catalog():
+    """Build the catalog, prerequisite graph and search index of the loaded ontology."""
+    global catalog, prerequisite_graph, search_index
+    catalog = Catalog([concept_to_dict(c) for c in GeometricConcept.instances()],
+                      [problem_to_dict(p) for p in Problem.instances()], ONTO_VERSION)
+    prerequisite_graph = PrerequisiteGraph(catalog)
+    search_index = SearchIndex(catalog, MAX_SEARCH_RESULTS)
+
+build_catalog()
+
+
 def get_or_create_student(student_id: str):
     """Get or create OWL individual Student_{id}."""
     s = onto.search_one(iri=f"*#Student_{student_id}")
     if s:
         return s
     with onto:
-        return StudentModel(f"Student_{student_id}")
+        s = StudentModel(f"Student_{student_id}")
+    bump_generation(s)
+    return s
 
-def update_student_in_ontology(student_id: str, known_codes: List[str]):
+def update_student_in_ontology(student_id: str, known_codes: List[str], reason: bool = True):
     """
     Update StudentModel individual with knowsConcept assertions
-    and run reasoner to infer needsToLearn etc.
+    and run reasoner to infer needsToLearn etc. With reason=False the
+    inferences are left stale until the student is next read.
     """
-    # cache (prevents accidental overwrites across requests)
-    student_cache[student_id] = list(dict.fromkeys(known_codes))
+    # One critical section from reading the current edges to the reasoner:
+    # concurrent updates of the same student would otherwise apply deltas
+    # computed from the same stale edge list
+    with reasoner_lock:
+        # cache (prevents accidental overwrites across requests)
+        student_cache[student_id] = list(dict.fromkeys(known_codes))
 
-    s = get_or_create_student(student_id)
+        s = get_or_create_student(student_id)
+        was_current = inferences_current(s)
 
-    # Clear + repopulate knowsConcept
-    s.knowsConcept = []
-    for code in student_cache[student_id]:
-        c_ind = concept_index.get(code)
-        if c_ind:
-            s.knowsConcept.append(c_ind)
+        # Apply only the knowsConcept delta
+        wanted = [concept_index[code] for code in student_cache[student_id] if code in concept_index]
+        current = list(s.knowsConcept)
+        added = [c for c in wanted if c not in current]
+        removed = [c for c in current if c not in wanted]
+        for c in removed:
+            s.knowsConcept.remove(c)
+        for c in added:
+            s.knowsConcept.append(c)
+        if added or removed:
+            gen = bump_generation(s)
 
-    run_reasoner()
-    return s
+        if not reason or inferences_current(s):
+            return s
+        if not was_current:
+            # Earlier changes were never reasoned: a delta alone is not enough
+            run_reasoner(s)
+        elif native_reasoning():
+            # The materialized inferences only need the delta
+            active_backend().apply_delta(
+                s,
+                [("knowsConcept", s, c) for c in added],
+                [("knowsConcept", s, c) for c in removed],
+            )
+            reasoned_generation[s.iri] = gen
+        else:
+            run_reasoner(s)
+        return s
 
 def student_recommendations(s_ind) -> List[dict]:
     """Read inferred needsToLearn(Student, Concept)."""
     recs = []
     for c in getattr(s_ind, "needsToLearn", []):
-        recs.append(concept_to_dict(c))
+        recs.append(concept_dto(c))
     return recs
 
+def student_known_codes(student_id: str) -> List[str]:
+    """
+    Codes of the concepts Student_{id} knows, read from its knowsConcept
+    assertions: students that only exist in the ontology count too.
+    """
+    s = onto.search_one(iri=f"*#Student_{student_id}")
+    if s is None:
+        return []
+    return [str(code) for c in s.knowsConcept if (code := first_literal(c, "hasConceptCode")) is not None]
+
 def teacher_recommendations() -> List[dict]:
     """Read recommendsConcept(VirtualTeacher1, Concept)."""
     if not VirtualTeacher:
         return []
-    return [concept_to_dict(c) for c in getattr(VirtualTeacher, "recommendsConcept", [])]
+    return [concept_dto(c) for c in getattr(VirtualTeacher, "recommendsConcept", [])]
 
 def teacher_misconceptions() -> List[dict]:
     """Read detectsMisconception(VirtualTeacher1, MisconceptionPattern)."""
@@ -173,6 +443,807 @@ def teacher_misconceptions() -> List[dict]:
             })
     return out
 
+# ----------------------------
+# TBox classification snapshot
+# ----------------------------
+def classify_tbox() -> dict:
+    """
+    Classify the class hierarchy with HermiT on a copy of the ontology
+    stripped of individuals; fall back to the told hierarchy without Java.
+    """
+    world = World()
+    tbox = world.get_ontology(ONTO_PATH).load()
+    for ind in list(tbox.individuals()):
+        destroy_entity(ind)
+    classified_by = "hermit"
+    try:
+        sync_reasoner(tbox, debug=0)
+    except Exception as e:
+        print(f"TBox classification with HermiT failed ({type(e).__name__}); using told hierarchy.")
+        classified_by = "told"
+    superclasses = {
+        cls.iri: sorted(a.iri for a in cls.ancestors() if isinstance(a, ThingClass))
+        for cls in tbox.classes()
+    }
+    world.close()
+    return {"ontology_version": ONTO_VERSION, "classified_by": classified_by, "superclasses": superclasses}
+
+def java_available() -> bool:
+    return shutil.which(owlready2.JAVA_EXE) is not None
+
+def tbox_snapshot_valid(snap: Optional[dict]) -> bool:
+    """Made for this ontology version, and by HermiT unless Java is still missing."""
+    return bool(snap) and snap.get("ontology_version") == ONTO_VERSION and \
+        (snap.get("classified_by") == "hermit" or not java_available())
+
+def load_tbox_snapshot() -> Dict[str, Set[str]]:
+    """
+    Class name -> names of the class and all its superclasses. Read from the
+    snapshot next to the ontology; classified and saved when it is missing,
+    was made for another ontology version, or only holds the told hierarchy
+    and Java has become available since.
+    """
+    snap = None
+    try:
+        with open(TBOX_SNAPSHOT_PATH, encoding="utf-8") as f:
+            snap = json.load(f)
+    except (OSError, ValueError):
+        pass
+    if not tbox_snapshot_valid(snap):
+        snap = classify_tbox()
+        try:
+            with open(TBOX_SNAPSHOT_PATH, "w", encoding="utf-8") as f:
+                json.dump(snap, f, indent=1)
+        except OSError as e:
+            print(f"Could not save TBox snapshot: {e}")
+
+    def name(iri: str) -> str:
+        return iri.rsplit("#", 1)[-1].rsplit("/", 1)[-1]
+
+    return {name(c): {name(a) for a in ancestors} for c, ancestors in snap["superclasses"].items()}
+
+tbox_superclasses = load_tbox_snapshot()
+
+def instance_of(ind, cls_name: str) -> bool:
+    """Membership test against the frozen hierarchy (asserted types only)."""
+    return any(cls_name in tbox_superclasses.get(c.name, {c.name}) for c in ind.is_a if isinstance(c, ThingClass))
+
+# ----------------------------
+# Native SWRL rule engine
+# ----------------------------
+def individual_facts(ind, skip: Set[str] = frozenset()) -> List[Fact]:
+    """Asserted class memberships (with superclasses) and object-property edges of `ind`."""
+    types = {"Thing"}
+    for cls in ind.is_a:
+        if isinstance(cls, ThingClass):
+            types |= tbox_superclasses.get(cls.name, {cls.name})
+    facts: List[Fact] = [(name, ind, None) for name in types]
+    for prop in ind.get_properties():
+        if isinstance(prop, ObjectPropertyClass) and prop.name not in skip:
+            facts.extend((prop.name, ind, o) for o in prop[ind])
+    return facts
+
+def build_rule_engine():
+    """
+    Compile onto.rules() and materialize them: a Rete network, or the
+    semi-naive engine for recursive rule sets. None if any rule is unsupported.
+    """
+    try:
+        rules = [CompiledRule(r) for r in onto.rules()]
+    except UnsupportedRule as e:
+        print(f"Native reasoner disabled ({e}); using HermiT.")
+        return None
+    engine = build_engine(rules)
+    # Rule-head properties are owned by the engine: their values in the
+    # ontology are our own write-backs, never input facts.
+    engine.update([f for ind in onto.individuals() for f in individual_facts(ind, engine.heads)], [])
+    return engine
+
+# Individual storid -> storids of the classes write_back added to its is_a.
+# They are inferences, so they are never read back as asserted types.
+inferred_types: Dict[int, Set[int]] = {}
+
+def write_back(engine, subjects: Iterable[Any]):
+    """Mirror derived property values and class memberships into the ontology so readers see them."""
+    for ind in subjects:
+        for pred in engine.heads:
+            prop = onto[pred]
+            if not isinstance(prop, ObjectPropertyClass):
+                continue
+            values = engine.store.objects(pred, ind)
+            if set(getattr(ind, prop.python_name, [])) != values:
+                setattr(ind, prop.python_name, sorted(values, key=lambda v: v.name))
+        write_back_types(engine, ind)
+
+def write_back_types(engine, ind):
+    """
+    Add derived class memberships to `ind.is_a`, most specific ones only (as
+    HermiT does), and drop earlier ones that no longer hold.
+    """
+    old = inferred_types.get(ind.storid, set())
+    asserted = [c for c in ind.is_a if isinstance(c, ThingClass) and c.storid not in old]
+    derived = {onto[f[0]] for f in engine.derived.get(ind, ()) if f[2] is None}
+    derived = {c for c in derived if isinstance(c, ThingClass)}
+    types = set(asserted) | derived
+    wanted = {c for c in derived
+              if c not in asserted and not any(o is not c and c in o.ancestors() for o in types)}
+    if {c.storid for c in wanted} == old:
+        return
+    for c in list(ind.is_a):
+        if isinstance(c, ThingClass) and c.storid in old and c not in wanted:
+            ind.is_a.remove(c)
+    for c in sorted(wanted, key=lambda c: c.name):
+        if c not in ind.is_a:
+            ind.is_a.append(c)
+    if wanted:
+        inferred_types[ind.storid] = {c.storid for c in wanted}
+    else:
+        inferred_types.pop(ind.storid, None)
+
+rule_engine = build_rule_engine()
+
+# ----------------------------
+# OWL 2 RL materializer
+# ----------------------------
+def rl_facts(ind=None, skip: Set[str] = frozenset()) -> List[Fact]:
+    """quadstore_facts over `onto`, leaving out the types written back as inferences."""
+    return quadstore_facts(onto, ind, skip, inferred_types)
+
+def build_rl_engine():
+    """SWRL rules plus the RL schema rules (owl_rl), materialized; None outside the supported profile."""
+    violations = rl_profile_violations(onto)
+    if violations:
+        print(f"OWL 2 RL engine disabled (ontology uses {', '.join(violations)}).")
+        return None
+    try:
+        rules = rl_schema_rules(onto) + [CompiledRule(r) for r in onto.rules()]
+    except UnsupportedRule as e:
+        print(f"OWL 2 RL engine disabled ({e}).")
+        return None
+    engine = build_engine(rules)
+    engine.update(rl_facts(skip=engine.heads), [])
+    # Types are materialized for every individual up front, as HermiT would
+    for ind in list(engine.derived):
+        write_back_types(engine, ind)
+    return engine
+
+def rl_engine_wanted() -> bool:
+    """Only built when it can be used: ITS_REASONER=rl, or HermiT with the RL fast path."""
+    return REASONER_BACKEND == "rl" or (REASONER_BACKEND == "hermit" and RL_FASTPATH)
+
+rl_engine = build_rl_engine() if rl_engine_wanted() else None
+
+# ----------------------------
+# Student-scoped reasoning module
+# ----------------------------
+class StudentModule:
+    """
+    Private world with the TBox, the concept/problem ABox and one scratch
+    student per student being reasoned. HermiT reasons over it instead of
+    `onto`, so its input does not grow with the number of students the
+    server has seen.
+    """
+
+    SCRATCH = "Student__module"
+
+    def __init__(self, path: str):
+        self.world = World()
+        self.onto = self.world.get_ontology(path).load()
+        for st in list(self.onto.StudentModel.instances()):
+            destroy_entity(st)
+        # Inferred student properties: those the SWRL rules conclude about a
+        # StudentModel. Other student properties are asserted and left alone
+        heads = {atom.property_predicate for rule in self.onto.rules() for atom in rule.head
+                 if isinstance(atom, IndividualPropertyAtom)}
+        self.inferred_props = [
+            p for p in self.onto.object_properties()
+            if p in heads and p.name != "knowsConcept"
+            and (not p.domain or any(isinstance(d, ThingClass) and self.onto.StudentModel in d.descendants()
+                                     for d in p.domain))
+        ]
+        self.lock = threading.Lock()
+
+    def reason(self, *students, sync=sync_reasoner):
+        """Reason once over the module with each student's knowsConcept; copy inferences back."""
+        with self.lock:
+            # Recreate the scratch students so no inference of a previous run survives
+            for old in list(self.onto.StudentModel.instances()):
+                destroy_entity(old)
+            scratches = []
+            for i, s_ind in enumerate(students):
+                with self.onto:
+                    scratch = self.onto.StudentModel(f"{self.SCRATCH}_{i}")
+                scratch.knowsConcept = [self.world[c.iri] for c in s_ind.knowsConcept]
+                scratches.append(scratch)
+
+            sync(self.onto, infer_property_values=True, debug=0)
+
+            for s_ind, scratch in zip(students, scratches):
+                # Set every inferred property, empty ones included, so lost inferences are cleared
+                for prop in self.inferred_props:
+                    values = [onto.world[v.iri] for v in prop[scratch]]
+                    setattr(s_ind, prop.python_name, [v for v in values if v is not None])
+
+_student_module: Optional[StudentModule] = None
+
+def get_student_module() -> StudentModule:
+    """Load the reasoning module on first use (only HermiT mode needs it)."""
+    global _student_module
+    if _student_module is None:
+        _student_module = StudentModule(ONTO_PATH)
+    return _student_module
+
+# ----------------------------
+# Reasoner backends
+# ----------------------------
+class ReasonerBackend:
+    """Brings inferences up to date for one student or for the whole ontology."""
+
+    name = ""
+
+    @property
+    def whole_world(self) -> bool:
+        """Whether a single student can only be reasoned by reasoning over everything."""
+        return False
+
+    def reason_student(self, s_ind):
+        raise NotImplementedError
+
+    def reason_world(self):
+        raise NotImplementedError
+
+class NativeBackend(ReasonerBackend):
+    """An in-process engine materializing rules over facts read by `facts(ind, skip)`."""
+
+    def __init__(self, name: str, engine, facts):
+        self.name = name
+        self.engine = engine
+        self.facts = facts
+
+    def reason_student(self, s_ind):
+        """Bring the engine in line with `s_ind`'s current assertions."""
+        engine = self.engine
+        derived = engine.derived.get(s_ind, set())
+        old = {f for f in engine.store.about(s_ind) if f not in derived}
+        new = set(self.facts(s_ind, engine.heads))
+        self.apply_delta(s_ind, new - old, old - new)
+
+    def reason_world(self):
+        for s_ind in StudentModel.instances():
+            self.reason_student(s_ind)
+
+    def apply_delta(self, s_ind, added: Iterable[Fact], removed: Iterable[Fact]):
+        """Maintain inferences incrementally for asserted facts added/removed on `s_ind`."""
+        gained, lost = self.engine.update(added, removed)
+        write_back(self.engine, {s_ind} | {f[1] for f in gained | lost})
+
+class OwlReasonerBackend(ReasonerBackend):
+    """A Java OWL reasoner driven by owlready2 (HermiT or Pellet)."""
+
+    def __init__(self, name: str, sync):
+        self.name = name
+        self.sync = sync
+
+    @property
+    def whole_world(self) -> bool:
+        return REASONING_SCOPE == "world"
+
+    def reason_student(self, s_ind):
+        get_student_module().reason(s_ind, sync=self.sync)
+
+    def reason_world(self):
+        self.sync(onto, infer_property_values=True)
+
+REASONER_BACKENDS: Dict[str, ReasonerBackend] = {
+    "native": NativeBackend("native", rule_engine, individual_facts),
+    "rl": NativeBackend("rl", rl_engine, rl_facts),
+    "hermit": OwlReasonerBackend("hermit", sync_reasoner),
+    "pellet": OwlReasonerBackend("pellet", sync_reasoner_pellet),
+}
+if REASONER_BACKEND not in REASONER_BACKENDS:
+    raise RuntimeError(f"Unknown ITS_REASONER {REASONER_BACKEND!r}; expected one of {sorted(REASONER_BACKENDS)}.")
+
+# Serializes reasoning runs: the rule engine and the reasoning module are not thread-safe
+reasoner_lock = threading.RLock()
+reasoner_executor = ThreadPoolExecutor(max_workers=REASONER_THREADS, thread_name_prefix="reasoner")
+
+def active_backend() -> ReasonerBackend:
+    """
+    The configured backend; the RL materializer in place of HermiT when the
+    ontology allows it, HermiT when the rules are beyond the in-process engines.
+    """
+    backend = REASONER_BACKENDS[REASONER_BACKEND]
+    if REASONER_BACKEND == "hermit" and rl_engine is not None:
+        return REASONER_BACKENDS["rl"]
+    if isinstance(backend, NativeBackend) and backend.engine is None:
+        return REASONER_BACKENDS["hermit"]
+    return backend
+
+# Defaults follow the backend that actually reasons, e.g. HermiT mode on
+# the RL fast path is in-process and needs neither a deadline nor batching
+if REASONING_DEADLINE_MS is None:
+    REASONING_DEADLINE_MS = 0.0 if native_reasoning() else 2000.0
+if REASONING_BATCH_WINDOW_MS is None:
+    REASONING_BATCH_WINDOW_MS = 0.0 if native_reasoning() else 5.0
+
+def deadline_budget(deadline_ms: Optional[float] = None) -> float:
+    return REASONING_DEADLINE_MS if deadline_ms is None else deadline_ms
+
+def wait_within_deadline(fut: Future, budget_ms: float) -> Tuple[Any, bool]:
+    """
+    (result, True) if `fut` completes within the budget, else (None, False);
+    the work then finishes in the background and its results serve later requests.
+    """
+    try:
+        return fut.result(timeout=budget_ms / 1000.0), True
+    except FuturesTimeout:
+        return None, False
+
+def within_deadline(fn, *args, deadline_ms: Optional[float] = None) -> Tuple[Any, bool]:
+    """Run `fn(*args)` within the latency budget (inline when there is none)."""
+    budget = deadline_budget(deadline_ms)
+    if budget <= 0:
+        return fn(*args), True
+    return wait_within_deadline(reasoner_executor.submit(fn, *args), budget)
+
+# ----------------------------
+# Group commit of student updates
+# ----------------------------
+class ReasoningCoordinator:
+    """
+    Collects /student/update calls for a short window, applies all their
+    knowsConcept changes, reasons once for the whole batch (once per round
+    when a student repeats) and then completes every waiting request.
+    """
+
+    def __init__(self, window_ms: float):
+        self.window = window_ms / 1000.0
+        self.queue: "queue.Queue[Tuple[str, List[str], Future]]" = queue.Queue()
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+        self.batches = self.updates = 0
+
+    def enqueue(self, student_id: str, known_codes: List[str]) -> Future:
+        """Queue an update; the future yields the student's recommendations once its batch is reasoned."""
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="reasoning-coordinator", daemon=True)
+                self.thread.start()
+        fut: Future = Future()
+        self.queue.put((student_id, known_codes, fut))
+        return fut
+
+    def submit(self, student_id: str, known_codes: List[str]):
+        return self.enqueue(student_id, known_codes).result()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.window
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._commit(batch)
+
+    def _commit(self, batch):
+        # The n-th update of each student goes into round n: a student appears
+        # once per round, so every waiter gets the recommendations of its own
+        # knowledge state, and later updates still win in arrival order
+        rounds: List[list] = []
+        seen: Dict[str, int] = defaultdict(int)
+        for item in batch:
+            n = seen[item[0]]
+            seen[item[0]] += 1
+            if n == len(rounds):
+                rounds.append([])
+            rounds[n].append(item)
+        for updates in rounds:
+            self._commit_round(updates)
+        self.batches += 1
+        self.updates += len(batch)
+
+    def _commit_round(self, updates):
+        try:
+            with reasoner_lock:
+                students = [update_student_in_ontology(sid, codes, reason=False) for sid, codes, _ in updates]
+                reason_batch(students)
+                recs = [student_recommendations(s) for s in students]
+        except Exception as e:
+            for _, _, fut in updates:
+                fut.set_exception(e)
+            return
+        for r, (_, _, fut) in zip(recs, updates):
+            fut.set_result(r)
+
+reasoning_coordinator = ReasoningCoordinator(REASONING_BATCH_WINDOW_MS) if REASONING_BATCH_WINDOW_MS > 0 else None
+
+def update_and_recommend(student_id: str, known_codes: List[str]) -> List[dict]:
+    """
+    Update a student, reason and read its recommendations in one critical
+    section, so they belong to `known_codes` and not to a later update.
+    """
+    with reasoner_lock:
+        return student_recommendations(update_student_in_ontology(student_id, known_codes))
+
+def submit_student_update(student_id: str, known_codes: List[str]) -> List[dict]:
+    """
+    Update a student and reason, batched with concurrent updates when
+    enabled; returns the recommendations for `known_codes`.
+    """
+    if reasoning_coordinator is not None:
+        return reasoning_coordinator.submit(student_id, known_codes)
+    return update_and_recommend(student_id, known_codes)
+
+def enqueue_student_update(student_id: str, known_codes: List[str]) -> Future:
+    """Like submit_student_update, without waiting for the result."""
+    if reasoning_coordinator is not None:
+        return reasoning_coordinator.enqueue(student_id, known_codes)
+    return reasoner_executor.submit(update_and_recommend, student_id, known_codes)
+
+# ----------------------------
+# Recommendation cache
+# ----------------------------
+class RecommendationCache:
+    """
+    Bounded LRU of serialized recommendation lists keyed by
+    (ontology version, frozenset of known concept codes).
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.entries: "OrderedDict[Tuple[str, frozenset], List[dict]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key) -> Optional[List[dict]]:
+        with self.lock:
+            recs = self.entries.get(key)
+            if recs is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return recs
+
+    def put(self, key, recs: List[dict]):
+        with self.lock:
+            self.entries[key] = recs
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+recommendation_cache = RecommendationCache(RECOMMENDATION_CACHE_SIZE)
+
+def knowledge_key(known_codes: Iterable[str]) -> Tuple[str, frozenset]:
+    """Cache key for a knowledge state; unknown codes never reach the ontology."""
+    return (ONTO_VERSION, frozenset(c for c in known_codes if c in concept_index))
+
+# ----------------------------
+# Asynchronous reasoning jobs
+# ----------------------------
+class ReasoningJob:
+    """A /student/update whose reasoning runs on the job executor."""
+
+    def __init__(self, student_id: str):
+        self.id = uuid.uuid4().hex
+        self.student_id = student_id
+        self.status = "pending"  # pending -> running -> done | failed
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.future: Optional[Future] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "student_id": self.student_id,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+        }
+
+jobs: "OrderedDict[str, ReasoningJob]" = OrderedDict()
+jobs_lock = threading.Lock()
+job_executor = ThreadPoolExecutor(max_workers=REASONING_JOB_WORKERS, thread_name_prefix="reasoning-job")
+
+def _run_update_job(job: ReasoningJob, student_id: str, known_codes: List[str]):
+    job.status = "running"
+    try:
+        recs = submit_student_update(student_id, known_codes)
+        recommendation_cache.put(knowledge_key(known_codes), recs)
+        job.result = student_update_body(student_id, recs, known=list(dict.fromkeys(known_codes)))
+        job.status = "done"
+    except Exception as e:
+        job.error = f"{type(e).__name__}: {e}"
+        job.status = "failed"
+        raise
+
+def start_update_job(student_id: str, known_codes: List[str]) -> ReasoningJob:
+    job = ReasoningJob(student_id)
+    with jobs_lock:
+        jobs[job.id] = job
+        # Forget the oldest finished jobs beyond the retention limit
+        for old_id in [j.id for j in jobs.values() if j.future and j.future.done()][:max(0, len(jobs) - JOB_RETENTION)]:
+            del jobs[old_id]
+        job.future = job_executor.submit(_run_update_job, job, student_id, known_codes)
+    return job
+
+# ----------------------------
+# Vectorized population reasoning
+# ----------------------------
+try:
+    import numpy as np
+except ImportError:  # optional: class-wide queries fall back to per-student reasoning
+    np = None
+
+class MatrixRule:
+    """
+    A rule of the form  Cs(?s) ^ Cc(?c) ^ A(?c, ?p) ^ B(?s, ?p) -> H(?s, ?c)
+    (class atoms optional): a join of the student x concept relation B with
+    the concept x concept relation A. Over a population it is one matrix
+    product, H = (B . A^T) > 0, masked by the class atoms.
+    """
+
+    def __init__(self, head: str, student_rel: str, concept_rel: str,
+                 student_classes: List[str], concept_classes: List[str]):
+        self.head = head
+        self.student_rel = student_rel
+        self.concept_rel = concept_rel
+        self.student_classes = student_classes
+        self.concept_classes = concept_classes
+
+    @classmethod
+    def match(cls, rule: CompiledRule) -> Optional["MatrixRule"]:
+        props = [a for a in rule.body if a[2] is not None]
+        classes = [a for a in rule.body if a[2] is None]
+        if len(rule.head) != 1 or rule.head[0][2] is None or len(props) != 2:
+            return None
+        head, s, c = rule.head[0]
+        if not (is_var(s) and is_var(c)) or s == c:
+            return None
+        if not all(a[1] in (s, c) for a in classes):
+            return None
+        for b, a in (props, props[::-1]):
+            if b[1] == s and a[1] == c and is_var(b[2]) and b[2] == a[2] and b[2] not in (s, c):
+                return cls(head, b[0], a[0],
+                           [t[0] for t in classes if t[1] == s],
+                           [t[0] for t in classes if t[1] == c])
+        return None
+
+class PopulationReasoner:
+    """Evaluates MatrixRules for many students at once over interned concept ids."""
+
+    def __init__(self, rules: List[MatrixRule]):
+        self.rules = rules
+        self.concepts = sorted(GeometricConcept.instances(), key=lambda c: c.name)
+        self.codes = [str(first_literal(c, "hasConceptCode") or "") for c in self.concepts]
+        self.ids = {c: i for i, c in enumerate(self.concepts)}
+        # concept x concept relations and concept class masks never change at runtime
+        self.relations = {r.concept_rel: self._matrix(self.concepts, r.concept_rel) for r in rules}
+        self.masks = {
+            name: np.array([instance_of(c, name) for c in self.concepts])
+            for r in rules for name in r.concept_classes
+        }
+
+    def _matrix(self, rows: List[Any], pred: str) -> "np.ndarray":
+        m = np.zeros((len(rows), len(self.concepts)), dtype=np.float32)
+        name = onto[pred].python_name
+        for i, ind in enumerate(rows):
+            for v in getattr(ind, name, []):
+                j = self.ids.get(v)
+                if j is not None:
+                    m[i, j] = 1
+        return m
+
+    def infer(self, students: List[Any]) -> Dict[str, "np.ndarray"]:
+        """Head predicate -> boolean (students x concepts) matrix."""
+        known = {r.student_rel: self._matrix(students, r.student_rel) for r in self.rules}
+        out: Dict[str, "np.ndarray"] = {}
+        for r in self.rules:
+            h = (known[r.student_rel] @ self.relations[r.concept_rel].T) > 0
+            for name in r.concept_classes:
+                h &= self.masks[name][None, :]
+            for name in r.student_classes:
+                h &= np.array([instance_of(s, name) for s in students])[:, None]
+            out[r.head] = out[r.head] | h if r.head in out else h
+        return out
+
+def build_population_reasoner() -> Optional[PopulationReasoner]:
+    """Only when NumPy is installed and every rule has the matrix form."""
+    if np is None:
+        return None
+    try:
+        rules = [MatrixRule.match(CompiledRule(r)) for r in onto.rules()]
+    except UnsupportedRule:
+        return None
+    if not rules or not all(rules):
+        return None
+    return PopulationReasoner(rules)
+
+population_reasoner = build_population_reasoner()
+
+def class_recommendations(student_ids: List[str]) -> Dict[str, List[str]]:
+    """needsToLearn concept codes for many students in one pass."""
+    students = [get_or_create_student(sid) for sid in student_ids]
+    if population_reasoner is not None:
+        h = population_reasoner.infer(students).get("needsToLearn")
+        if h is None:
+            return {sid: [] for sid in student_ids}
+        return {
+            sid: [population_reasoner.codes[j] for j in np.flatnonzero(row)]
+            for sid, row in zip(student_ids, h)
+        }
+    reason_batch(students)
+    return {
+        sid: [str(first_literal(c, "hasConceptCode") or "") for c in getattr(s, "needsToLearn", [])]
+        for sid, s in zip(student_ids, students)
+    }
+
+def recompute_all_students() -> int:
+    """Recompute every student's rule inferences; returns the number of students."""
+    students = list(StudentModel.instances())
+    if population_reasoner is None or native_reasoning():
+        # The rule engine is already incremental; without NumPy reason per student
+        reason_batch(students)
+        return len(students)
+    gens = {s.iri: student_generation.get(s.iri, 0) for s in students}
+    for pred, h in population_reasoner.infer(students).items():
+        name = onto[pred].python_name
+        for s_ind, row in zip(students, h):
+            values = [population_reasoner.concepts[j] for j in np.flatnonzero(row)]
+            if set(getattr(s_ind, name, [])) != set(values):
+                setattr(s_ind, name, values)
+    reasoned_generation.update(gens)
+    return len(students)
+
+# ----------------------------
+# Recommendation preview (what-if)
+# ----------------------------
+class PreviewReasoner:
+    """
+    needsToLearn for a hypothetical student as a pure function of the concept
+    codes it knows. Each MatrixRule over knowsConcept becomes a lookup table:
+    knowing p opens every concept c with concept_rel(c, p) that is in the
+    rule's concept classes. Tables are frozen at load time and DTOs come from
+    the catalog, so a preview never reads or writes `onto`.
+    """
+
+    def __init__(self, rules: List[MatrixRule]):
+        concepts = sorted(GeometricConcept.instances(), key=lambda c: c.name)
+        code_of = {c: str(first_literal(c, "hasConceptCode") or "") for c in concepts}
+        self.order = {code_of[c]: i for i, c in enumerate(concepts)}
+        self.opens: Dict[str, Set[str]] = defaultdict(set)
+        for r in rules:
+            # A bare StudentModel only has the knowsConcept edges it is given
+            if r.head != "needsToLearn" or r.student_rel != "knowsConcept" or \
+                    not set(r.student_classes) <= {"StudentModel", "Thing"}:
+                continue
+            for c in concepts:
+                if not all(instance_of(c, name) for name in r.concept_classes):
+                    continue
+                for p in getattr(c, onto[r.concept_rel].python_name, []):
+                    if p in code_of:
+                        self.opens[code_of[p]].add(code_of[c])
+
+    def recommend(self, known: frozenset) -> List[dict]:
+        codes = set()
+        for k in known:
+            codes |= self.opens.get(k, set())
+        return [catalog.by_code[c] for c in sorted(codes, key=self.order.__getitem__)]
+
+def build_preview_reasoner() -> Optional[PreviewReasoner]:
+    """Only when every rule has the matrix form (NumPy is not needed)."""
+    try:
+        rules = [MatrixRule.match(CompiledRule(r)) for r in onto.rules()]
+    except UnsupportedRule:
+        return None
+    if not all(rules):
+        return None
+    return PreviewReasoner(rules)
+
+preview_reasoner = build_preview_reasoner()
+preview_cache = RecommendationCache(RECOMMENDATION_CACHE_SIZE)
+
+def preview_recommendations(known_codes: Iterable[str]) -> List[dict]:
+    """Recommendations a student knowing `known_codes` would get, without creating one."""
+    key = knowledge_key(known_codes)
+    recs = preview_cache.get(key)
+    if recs is None:
+        recs = preview_reasoner.recommend(key[1])
+        preview_cache.put(key, recs)
+    return recs
+
+# ----------------------------
+# Learning paths
+# ----------------------------
+learning_path_cache = RecommendationCache(RECOMMENDATION_CACHE_SIZE)
+
+def learning_path(target: str, known_codes: Iterable[str]) -> List[List[dict]]:
+    """
+    Concepts to learn on the way to `target`, in prerequisite layers, easiest
+    first within a layer. Memoized on the known concepts that matter for it.
+    """
+    graph = prerequisite_graph
+    i = graph.ids[target]
+    relevant = (graph.ancestors[i] | (1 << i)) & graph.known_mask(known_codes)
+    key = (ONTO_VERSION, target, relevant)
+    path = learning_path_cache.get(key)
+    if path is None:
+        dtos = [catalog.by_code[graph.codes[i]] for i in range(len(graph.codes))]
+
+        def difficulty(i: int):
+            d = dtos[i]["difficulty"]
+            return (d is None, d or 0, graph.codes[i])
+
+        path = [[dtos[i] for i in sorted(layer, key=difficulty)]
+                for layer in graph.layers(target, (graph.codes[i] for i in graph.bit_ids(relevant)))]
+        learning_path_cache.put(key, path)
+    return path
+
+def build_curriculum_planner() -> CurriculumPlanner:
+    return CurriculumPlanner(
+        prerequisite_graph, catalog, RecommendationCache(RECOMMENDATION_CACHE_SIZE),
+        PLAN_DIFFICULTY_WEIGHT, PLAN_KS_WEIGHT, PLAN_NO_PROBLEM_PENALTY,
+    )
+
+curriculum_planner = build_curriculum_planner()
+
+# ----------------------------
+# Ontology reload
+# ----------------------------
+def reload_ontology() -> dict:
+    """
+    Re-read ONTO_PATH into a fresh world and rebuild everything derived from
+    it: version, TBox snapshot, rule engines, vectorized and preview
+    reasoners, catalog, graph, search and planner. Known students are
+    re-created from student_cache and reasoned again on their next read;
+    every cache is dropped. Runs under the reasoner lock.
+    """
+    global concept_index, tbox_superclasses, rule_engine, rl_engine, _student_module
+    global population_reasoner, preview_reasoner, curriculum_planner, world_reasoned_generation
+    with reasoner_lock:
+        previous = ONTO_VERSION
+        load_ontology(World())
+        concept_index = build_concept_index()
+        build_catalog()
+        curriculum_planner = build_curriculum_planner()
+        tbox_superclasses = load_tbox_snapshot()
+        inferred_types.clear()
+        _student_module = None
+        with generation_lock:
+            student_generation.clear()
+            reasoned_generation.clear()
+            world_reasoned_generation = -1
+        for student_id, known_codes in list(student_cache.items()):
+            update_student_in_ontology(student_id, known_codes, reason=False)
+
+        rule_engine = build_rule_engine()
+        rl_engine = build_rl_engine() if rl_engine_wanted() else None
+        REASONER_BACKENDS["native"].engine = rule_engine
+        REASONER_BACKENDS["rl"].engine = rl_engine
+        population_reasoner = build_population_reasoner()
+        preview_reasoner = build_preview_reasoner()
+        for cache in (recommendation_cache, preview_cache, learning_path_cache):
+            cache.clear()
+    return {"ontology_version": ONTO_VERSION, "changed": ONTO_VERSION != previous,
+            "students": len(student_cache)}
+
 # ----------------------------
 # Request models
 # ----------------------------
@@ -180,56 +1251,216 @@ class StudentUpdateRequest(BaseModel):
     student_id: str
     known_concepts: List[str]
 
+class ClassRecommendRequest(BaseModel):
+    student_ids: List[str]
+
+class PreviewRequest(BaseModel):
+    known_concepts: List[str]
+
+class ClassPlanRequest(BaseModel):
+    student_ids: List[str]
+    target: str
+
 # ----------------------------
 # API Endpoints
 # ----------------------------
 @app.get("/concepts")
-def list_concepts():
-    return [concept_to_dict(c) for c in GeometricConcept.instances()]
+def list_concepts(request: Request, fields: Optional[str] = None,
+                  limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None):
+    if fields is None and limit is None and cursor is None:
+        return static_response(request, catalog.concepts_body)
+    return table_response(request, catalog.concept_table, range(len(catalog.concepts)), "concepts", fields, limit, cursor)
 
 @app.get("/concept/{code}")
-def get_concept(code: str):
-    c = concept_index.get(code)
-    if not c:
+def get_concept(code: str, request: Request):
+    body = catalog.concept_bodies.get(code)
+    if body is None:
         raise HTTPException(status_code=404, detail="Concept not found")
-    return concept_to_dict(c)
+    return static_response(request, body)
 
-@app.get("/problems")
-def list_problems(concept_code: Optional[str] = None):
-    results = []
-    for p in Problem.instances():
-        d = problem_to_dict(p)
-        if concept_code is None or d["concept_code"] == concept_code:
-            results.append(d)
-    return results
+@app.get("/concept/{code}/prerequisites")
+def concept_prerequisites(code: str, transitive: bool = False):
+    if code not in prerequisite_graph.ids:
+        raise HTTPException(status_code=404, detail="Concept not found")
+    return {"code": code, "transitive": transitive,
+            "prerequisites": prerequisite_graph.related(code, reverse=False, transitive=transitive)}
 
-@app.post("/student/update")
-def student_update(req: StudentUpdateRequest):
-    s_ind = update_student_in_ontology(req.student_id, req.known_concepts)
-    recs = student_recommendations(s_ind)
-    miscon = teacher_misconceptions()
+@app.get("/concept/{code}/dependents")
+def concept_dependents(code: str, transitive: bool = False):
+    if code not in prerequisite_graph.ids:
+        raise HTTPException(status_code=404, detail="Concept not found")
+    return {"code": code, "transitive": transitive,
+            "dependents": prerequisite_graph.related(code, reverse=True, transitive=transitive)}
+
+@app.get("/search")
+def search(q: str, limit: int = Query(10, ge=1, le=MAX_SEARCH_RESULTS)):
+    return {"query": q, "results": search_index.search(q, limit)}
 
+@app.get("/search/suggest")
+def search_suggest(q: str, limit: int = Query(10, ge=1, le=MAX_SEARCH_RESULTS)):
+    return {"query": q, "suggestions": search_index.complete(q.strip(), limit)}
+
+@app.get("/problems")
+def list_problems(request: Request, concept_code: Optional[str] = None, fields: Optional[str] = None,
+                  limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None):
+    if fields is not None or limit is not None or cursor is not None:
+        if concept_code is None:
+            ids, scope = range(len(catalog.problems)), "problems"
+        else:
+            ids, scope = catalog.problems_by_concept.get(concept_code, []), f"problems:{concept_code}"
+        return table_response(request, catalog.problem_table, ids, scope, fields, limit, cursor)
+    if concept_code is None:
+        body = catalog.problems_body
+    else:
+        body = catalog.concept_problems_bodies.get(concept_code, catalog.no_problems_body)
+    return static_response(request, body)
+
+def student_update_body(student_id: str, recs: List[dict], known: Optional[List[str]] = None,
+                        stale: bool = False) -> dict:
     return {
         "student": {
-            "student_id": req.student_id,
-            "known_concepts": student_cache.get(req.student_id, []),
+            "student_id": student_id,
+            "known_concepts": student_cache.get(student_id, []) if known is None else known,
         },
         "recommended_concepts": recs,
-        "misconceptions": miscon,
+        "misconceptions": teacher_misconceptions(),
+        "stale": stale,
     }
 
+@app.post("/student/update")
+def student_update(req: StudentUpdateRequest, mode: Literal["sync", "async"] = "sync",
+                   deadline_ms: Optional[float] = None):
+    key = knowledge_key(req.known_concepts)
+    recs = recommendation_cache.get(key)
+    if recs is not None:
+        # Same knowledge state seen before: record it, skip reasoning
+        update_student_in_ontology(req.student_id, req.known_concepts, reason=False)
+    elif mode == "async":
+        # 202 with the student's current (possibly stale) recommendations;
+        # the fresh ones are delivered through /jobs/{job_id}. The body is
+        # read before the job starts, so it never holds the job's results
+        body = student_update_body(
+            req.student_id, student_recommendations(get_or_create_student(req.student_id)),
+            known=list(dict.fromkeys(req.known_concepts)), stale=True,
+        )
+        job = start_update_job(req.student_id, req.known_concepts)
+        body.update({"job_id": job.id, "status": job.status})
+        return FastJSONResponse(status_code=202, content=body)
+    else:
+        budget = deadline_budget(deadline_ms)
+        if budget > 0:
+            recs, done = wait_within_deadline(enqueue_student_update(req.student_id, req.known_concepts), budget)
+        else:
+            recs, done = submit_student_update(req.student_id, req.known_concepts), True
+        if not done:
+            # Out of budget: last materialized recommendations, marked stale
+            recs = student_recommendations(get_or_create_student(req.student_id))
+            return FastJSONResponse(student_update_body(
+                req.student_id, recs, known=list(dict.fromkeys(req.known_concepts)), stale=True))
+        recommendation_cache.put(key, recs)
+    return FastJSONResponse(student_update_body(req.student_id, recs, known=list(dict.fromkeys(req.known_concepts))))
+
+@app.get("/student/{student_id}/missing-prerequisites")
+def student_missing_prerequisites(student_id: str, target: str):
+    if target not in prerequisite_graph.ids:
+        raise HTTPException(status_code=404, detail="Concept not found")
+    return {
+        "student_id": student_id,
+        "target": target,
+        "missing": prerequisite_graph.missing_prerequisites(target, student_known_codes(student_id)),
+    }
+
+@app.get("/student/{student_id}/path")
+def student_path(student_id: str, target: str):
+    if target not in prerequisite_graph.ids:
+        raise HTTPException(status_code=404, detail="Concept not found")
+    layers = learning_path(target, student_known_codes(student_id))
+    return FastJSONResponse({"student_id": student_id, "target": target, "layers": layers})
+
+@app.get("/student/{student_id}/plan")
+def student_plan(student_id: str, target: str):
+    if target not in prerequisite_graph.ids:
+        raise HTTPException(status_code=404, detail="Concept not found")
+    plan = curriculum_planner.plan(target, student_known_codes(student_id))
+    return FastJSONResponse({"student_id": student_id, **plan})
+
+@app.post("/plan/class")
+def plan_class(req: ClassPlanRequest):
+    if req.target not in prerequisite_graph.ids:
+        raise HTTPException(status_code=404, detail="Concept not found")
+    plans = curriculum_planner.plan_class(
+        req.target, {sid: student_known_codes(sid) for sid in req.student_ids})
+    return FastJSONResponse({"target": req.target,
+                             "students": [{"student_id": sid, **plans[sid]} for sid in req.student_ids]})
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0):
+    """Job status; `wait` > 0 long-polls up to that many seconds for completion."""
+    job = jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if wait > 0 and not job.future.done():
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(job.future)), min(wait, JOB_MAX_WAIT_S))
+        except Exception:
+            pass  # timed out or failed: the status says which
+    return job.to_dict()
+
 @app.get("/recommend/{student_id}")
-def recommend(student_id: str):
+def recommend(student_id: str, deadline_ms: Optional[float] = None):
     s_ind = get_or_create_student(student_id)
-    run_reasoner()
-    return {"concepts": student_recommendations(s_ind)}
+    _, done = within_deadline(ensure_reasoned, s_ind, deadline_ms=deadline_ms)
+    return FastJSONResponse({"concepts": student_recommendations(s_ind), "stale": not done})
+
+@app.post("/recommend/class")
+def recommend_class(req: ClassRecommendRequest):
+    recs = class_recommendations(req.student_ids)
+    return {"students": [{"student_id": sid, "recommended_concepts": recs[sid]} for sid in req.student_ids]}
+
+@app.post("/recommend/preview")
+def recommend_preview(req: PreviewRequest):
+    if preview_reasoner is None:
+        raise HTTPException(status_code=501, detail="Preview is not available for this ontology's rules")
+    return FastJSONResponse({
+        "known_concepts": sorted(knowledge_key(req.known_concepts)[1]),
+        "recommended_concepts": preview_recommendations(req.known_concepts),
+    })
+
+@app.post("/recommend/recompute")
+def recommend_recompute():
+    return {"students": recompute_all_students(), "vectorized": population_reasoner is not None}
+
+@app.post("/admin/reload")
+def admin_reload():
+    """Reload the ontology file (e.g. after editing it in Protégé) without restarting."""
+    return reload_ontology()
+
+@app.get("/stats/recommendation-cache")
+def recommendation_cache_stats():
+    return recommendation_cache.stats()
+
+@app.get("/stats/reasoning")
+def reasoning_stats():
+    coordinator = reasoning_coordinator
+    engine = getattr(active_backend(), "engine", None)
+    return {
+        "backend": active_backend().name,
+        "rule_engine": type(engine).__name__ if engine else None,
+        "rete": engine.stats() if isinstance(engine, ReteNetwork) else None,
+        "deadline_ms": REASONING_DEADLINE_MS,
+        "world_generation": world_generation,
+        "batch_window_ms": REASONING_BATCH_WINDOW_MS,
+        "batches": coordinator.batches if coordinator else 0,
+        "batched_updates": coordinator.updates if coordinator else 0,
+    }
 
 @app.get("/teacher/recommend/{student_id}")
-def teacher_recommend(student_id: str):
+def teacher_recommend(student_id: str, deadline_ms: Optional[float] = None):
     # ensure student exists (ties teacher outputs to current ontology state)
-    get_or_create_student(student_id)
-    run_reasoner()
-    return {
+    s_ind = get_or_create_student(student_id)
+    _, done = within_deadline(ensure_reasoned, s_ind, True, deadline_ms=deadline_ms)
+    return FastJSONResponse({
         "recommended_concepts": teacher_recommendations(),
         "misconceptions": teacher_misconceptions(),
-    }
\ No newline at end of file
+        "stale": not done,
+    })
\ No newline at end of file
@@ -0,0 +1,113 @@
+"""
+The part of OWL 2 RL this ontology relies on, compiled to rules over the
+same facts as the SWRL engine (one rule per schema axiom):
+  cax-sco  subClassOf(C, D):  C(?x) -> D(?x)
+  prp-dom  domain(p, C):      p(?x, ?y) -> C(?x)   (object and data properties)
+  prp-rng  range(p, C):       p(?x, ?y) -> C(?y)   (object properties)
+Schema and assertions are read straight from owlready2's quadstore; joins
+run on the FactStore's hash indexes by predicate and subject/object.
+"""
+from typing import Dict, List, Set
+
+from owlready2 import (
+    DataProperty, TransitiveProperty, SymmetricProperty, AsymmetricProperty, FunctionalProperty,
+    InverseFunctionalProperty, ReflexiveProperty, IrreflexiveProperty,
+    rdf_type, rdf_domain, rdf_range, rdfs_subclassof, rdfs_subpropertyof, owl_thing, owl_named_individual,
+    owl_equivalentclass, owl_disjointwith, owl_alldisjointclasses, owl_disjointunion, owl_equivalentproperty,
+    owl_propdisjointwith, owl_inverse_property, owl_propertychain, owl_equivalentindividual, owl_onproperty,
+    owl_unionof, owl_intersectionof, owl_complementof, owl_oneof,
+)
+
+from rule_engine import CompiledRule, Fact
+
+RL_UNSUPPORTED_PREDICATES = {
+    owl_equivalentclass: "owl:equivalentClass",
+    owl_disjointwith: "owl:disjointWith",
+    owl_alldisjointclasses: "owl:AllDisjointClasses",
+    owl_disjointunion: "owl:disjointUnionOf",
+    owl_equivalentproperty: "owl:equivalentProperty",
+    owl_propdisjointwith: "owl:propertyDisjointWith",
+    owl_inverse_property: "owl:inverseOf",
+    owl_propertychain: "owl:propertyChainAxiom",
+    owl_equivalentindividual: "owl:sameAs",
+    owl_onproperty: "owl:Restriction",
+    owl_unionof: "owl:unionOf",
+    owl_intersectionof: "owl:intersectionOf",
+    owl_complementof: "owl:complementOf",
+    owl_oneof: "owl:oneOf",
+    rdfs_subpropertyof: "rdfs:subPropertyOf",
+}
+RL_UNSUPPORTED_CHARACTERISTICS = {
+    prop.storid: f"owl:{prop.__name__}" for prop in (
+        TransitiveProperty, SymmetricProperty, AsymmetricProperty, FunctionalProperty,
+        InverseFunctionalProperty, ReflexiveProperty, IrreflexiveProperty,
+    )
+}
+
+def rl_profile_violations(onto) -> List[str]:
+    """Axioms outside the materialized subset; empty when the RL engine can stand in for HermiT."""
+    found = set()
+    for s, p, o in onto._get_obj_triples_spo_spo(None, None, None):
+        if p in RL_UNSUPPORTED_PREDICATES:
+            found.add(RL_UNSUPPORTED_PREDICATES[p])
+        elif p == rdf_type and o in RL_UNSUPPORTED_CHARACTERISTICS:
+            found.add(RL_UNSUPPORTED_CHARACTERISTICS[o])
+        elif p in (rdfs_subclassof, rdf_domain, rdf_range) and o < 0:
+            found.add("class expression in subClassOf/domain/range")
+    for dp in onto.data_properties():
+        if dp.is_a != [DataProperty]:
+            found.add("data property characteristics")
+    return sorted(found)
+
+def rl_schema_rules(onto) -> List[CompiledRule]:
+    """cax-sco, prp-dom and prp-rng instantiated for every named-class axiom."""
+    classes = {c.storid: c.name for c in onto.classes()}
+    classes[owl_thing] = "Thing"
+    # A data property's range is a datatype, never in `classes`: only its domain makes a rule
+    props = {p.storid: p.name for p in list(onto.object_properties()) + list(onto.data_properties())}
+    rules = []
+    for s, p, o in onto._get_obj_triples_spo_spo(None, None, None):
+        if o not in classes:
+            continue
+        if p == rdfs_subclassof and s in classes:
+            body, head = [(classes[s], "?x", None)], [(classes[o], "?x", None)]
+        elif p == rdf_domain and s in props:
+            body, head = [(props[s], "?x", "?y")], [(classes[o], "?x", None)]
+        elif p == rdf_range and s in props:
+            body, head = [(props[s], "?x", "?y")], [(classes[o], "?y", None)]
+        else:
+            continue
+        rules.append(CompiledRule.from_atoms(f"{body[0]} -> {head[0]}", body, head))
+    return rules
+
+def quadstore_facts(onto, ind=None, skip: Set[str] = frozenset(),
+                    inferred_types: Dict[int, Set[int]] = None) -> List[Fact]:
+    """
+    Asserted class memberships (no closure: that is cax-sco's job, and the
+    `inferred_types` written back as inferences are left out), object-property
+    edges and data-property values (for prp-dom; the object is the raw stored
+    literal), for `ind` or every individual in `onto`.
+    """
+    inferred_types = inferred_types or {}
+    classes = {c.storid: c.name for c in onto.classes()}
+    props = {p.storid: p.name for p in onto.object_properties() if p.name not in skip}
+    data_props = {p.storid: p.name for p in onto.data_properties() if p.name not in skip}
+    entity = onto.world._get_by_storid
+    facts: List[Fact] = []
+    typed = set()
+    for s, p, o in onto._get_obj_triples_spo_spo(ind.storid if ind is not None else None, None, None):
+        if p == rdf_type:
+            if o in inferred_types.get(s, ()):
+                continue
+            if o == owl_named_individual or o in classes:
+                if s not in typed:
+                    typed.add(s)
+                    facts.append(("Thing", entity(s), None))
+                if o in classes:
+                    facts.append((classes[o], entity(s), None))
+        elif p in props:
+            facts.append((props[p], entity(s), entity(o)))
+    for s, p, o, _ in onto._get_data_triples_spod_spod(ind.storid if ind is not None else None, None, None, None):
+        if p in data_props:
+            facts.append((data_props[p], entity(s), o))
+    return facts
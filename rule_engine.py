@@ -0,0 +1,551 @@
+"""
+In-process rule engines for SWRL rules compiled from owlready2: semi-naive
+forward chaining with delete/rederive, and a Rete network for non-recursive
+rule sets. Both maintain a FactStore incrementally under base-fact deltas.
+"""
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from owlready2 import ClassAtom, IndividualPropertyAtom, ThingClass, Variable
+
+# Facts and rule atoms share one shape: (predicate name, subject, object).
+# Class memberships use object None; in atoms, variables are "?name" strings.
+Fact = Tuple[str, Any, Any]
+
+class UnsupportedRule(Exception):
+    """A SWRL rule uses atoms the native engine cannot evaluate."""
+
+class FactStore:
+    """Class memberships and object-property edges, indexed by subject and object."""
+
+    def __init__(self):
+        self.members: Dict[str, Set[Any]] = defaultdict(set)
+        self.out: Dict[str, Dict[Any, Set[Any]]] = defaultdict(lambda: defaultdict(set))
+        self.inv: Dict[str, Dict[Any, Set[Any]]] = defaultdict(lambda: defaultdict(set))
+
+    def __contains__(self, fact: Fact) -> bool:
+        pred, s, o = fact
+        if o is None:
+            return s in self.members.get(pred, ())
+        return o in self.out.get(pred, {}).get(s, ())
+
+    def add(self, fact: Fact) -> bool:
+        if fact in self:
+            return False
+        pred, s, o = fact
+        if o is None:
+            self.members[pred].add(s)
+        else:
+            self.out[pred][s].add(o)
+            self.inv[pred][o].add(s)
+        return True
+
+    def discard(self, fact: Fact) -> bool:
+        if fact not in self:
+            return False
+        pred, s, o = fact
+        if o is None:
+            self.members[pred].discard(s)
+        else:
+            self.out[pred][s].discard(o)
+            self.inv[pred][o].discard(s)
+        return True
+
+    def objects(self, pred: str, s) -> Set[Any]:
+        return self.out.get(pred, {}).get(s, set())
+
+    def subjects(self, pred: str, o) -> Set[Any]:
+        return self.inv.get(pred, {}).get(o, set())
+
+    def about(self, s) -> List[Fact]:
+        """Every fact whose subject is `s`."""
+        facts = [(cls, s, None) for cls, inds in self.members.items() if s in inds]
+        for pred, edges in self.out.items():
+            facts.extend((pred, s, o) for o in edges.get(s, ()))
+        return facts
+
+def is_var(term) -> bool:
+    return isinstance(term, str)
+
+def _compile_atom(atom) -> Fact:
+    def term(a):
+        return f"?{a.name}" if isinstance(a, Variable) else a
+
+    if isinstance(atom, ClassAtom) and isinstance(atom.class_predicate, ThingClass):
+        return (atom.class_predicate.name, term(atom.arguments[0]), None)
+    if isinstance(atom, IndividualPropertyAtom):
+        return (atom.property_predicate.name, term(atom.arguments[0]), term(atom.arguments[1]))
+    raise UnsupportedRule(f"unsupported SWRL atom: {atom}")
+
+def _atom_cost(atom: Fact, bound: Set[str]) -> int:
+    """Rough probe cost: 0 = membership check, 2 = index lookup, 3+ = scan."""
+    unbound = sum(1 for t in atom[1:] if t is not None and is_var(t) and t not in bound)
+    return unbound * 2 + (1 if atom[2] is None and unbound else 0)
+
+class CompiledRule:
+    """A swrl:Imp compiled to atoms, with join plans cached per entry point."""
+
+    def __init__(self, imp):
+        self.source = str(imp)
+        self.body = [_compile_atom(a) for a in imp.body]
+        self.head = [_compile_atom(a) for a in imp.head]
+        self._plans: Dict[Tuple[int, frozenset], List[Fact]] = {}
+
+    @classmethod
+    def from_atoms(cls, source: str, body: List[Fact], head: List[Fact]) -> "CompiledRule":
+        """A rule built from atoms directly rather than from a swrl:Imp."""
+        rule = cls.__new__(cls)
+        rule.source, rule.body, rule.head, rule._plans = source, body, head, {}
+        return rule
+
+    def plan(self, seed: int, bound: frozenset) -> List[Fact]:
+        """Order the body atoms other than `seed` so every step probes an index."""
+        key = (seed, bound)
+        plan = self._plans.get(key)
+        if plan is None:
+            plan, known = [], set(bound)
+            rest = [a for i, a in enumerate(self.body) if i != seed]
+            while rest:
+                atom = min(rest, key=lambda a: _atom_cost(a, known))
+                rest.remove(atom)
+                plan.append(atom)
+                known.update(t for t in atom[1:] if t is not None and is_var(t))
+            self._plans[key] = plan
+        return plan
+
+def _unify(atom: Fact, fact: Fact, binding: dict) -> Optional[dict]:
+    if atom[0] != fact[0]:
+        return None
+    b = dict(binding)
+    for t, v in zip(atom[1:], fact[1:]):
+        if t is None:
+            continue
+        if is_var(t):
+            if b.setdefault(t, v) != v:
+                return None
+        elif t != v:
+            return None
+    return b
+
+def _resolve(term, binding: dict):
+    return binding.get(term) if is_var(term) else term
+
+def _extend(store: FactStore, atom: Fact, binding: dict) -> Iterable[dict]:
+    """Yield `binding` extended with every way `atom` holds in `store`."""
+    pred, st, ot = atom
+    s = _resolve(st, binding)
+    if ot is None:
+        if s is not None:
+            if s in store.members.get(pred, ()):
+                yield binding
+        else:
+            for m in list(store.members.get(pred, ())):
+                yield {**binding, st: m}
+        return
+    o = _resolve(ot, binding)
+    if s is not None and o is not None:
+        if (pred, s, o) in store:
+            yield binding
+    elif s is not None:
+        for v in list(store.objects(pred, s)):
+            yield {**binding, ot: v}
+    elif o is not None:
+        for v in list(store.subjects(pred, o)):
+            yield {**binding, st: v}
+    else:
+        for subj, objs in list(store.out.get(pred, {}).items()):
+            for v in list(objs):
+                if st != ot or subj == v:
+                    yield {**binding, st: subj, ot: v}
+
+def net_changes(engine, gained: Set[Fact], lost: Set[Fact], removed: Set[Fact]) -> Tuple[Set[Fact], Set[Fact]]:
+    """
+    Net effect of one update on the store's derived facts, from the facts
+    derived and dropped along the way: a fact lost and rederived, or dropped
+    as a derivation but asserted in the same update, did not change, and
+    facts the update retracts itself are the caller's, not inferences.
+    """
+    return (
+        {f for f in gained - lost if f not in removed and f in engine.derived.get(f[1], ())},
+        {f for f in lost - gained if f not in removed and f not in engine.store},
+    )
+
+class RuleEngine:
+    """Semi-naive forward chaining of compiled SWRL rules over a FactStore."""
+
+    def __init__(self, store: FactStore, rules: List[CompiledRule]):
+        self.store = store
+        self.rules = rules
+        self.heads = {a[0] for r in rules for a in r.head}
+        # predicate -> (rule, body atom index) pairs it can trigger
+        self.triggers: Dict[str, List[Tuple[CompiledRule, int]]] = defaultdict(list)
+        for r in rules:
+            for i, atom in enumerate(r.body):
+                self.triggers[atom[0]].append((r, i))
+        # subject -> facts derived about it
+        self.derived: Dict[Any, Set[Fact]] = defaultdict(set)
+
+    def solve(self, rule: CompiledRule, binding: dict, seed: int = -1) -> List[dict]:
+        """Extend `binding` over the body of `rule`, skipping atom `seed` (already matched)."""
+        bindings = [binding]
+        for atom in rule.plan(seed, frozenset(binding)):
+            bindings = [b2 for b in bindings for b2 in _extend(self.store, atom, b)]
+            if not bindings:
+                break
+        return bindings
+
+    def matches(self, rule: CompiledRule, seed: int, fact: Fact) -> List[dict]:
+        """All bindings of `rule` in which body atom `seed` is matched by `fact`."""
+        binding = _unify(rule.body[seed], fact, {})
+        if binding is None:
+            return []
+        return self.solve(rule, binding, seed)
+
+    def consequences(self, fact: Fact) -> Iterable[Fact]:
+        """Head facts of every rule firing that uses `fact` in its body."""
+        for rule, seed in self.triggers.get(fact[0], ()):
+            for b in self.matches(rule, seed, fact):
+                for head in rule.head:
+                    yield (head[0], _resolve(head[1], b), _resolve(head[2], b))
+
+    def derivable(self, fact: Fact) -> bool:
+        """Whether some rule still derives `fact` from the current store."""
+        for rule in self.rules:
+            for head in rule.head:
+                binding = _unify(head, fact, {})
+                if binding is not None and self.solve(rule, binding):
+                    return True
+        return False
+
+    def derive(self, seeds: Iterable[Fact]) -> Set[Fact]:
+        """Fire every rule triggered by `seeds` (already in the store) to fixpoint."""
+        new: Set[Fact] = set()
+        delta = list(seeds)
+        while delta:
+            for h in self.consequences(delta.pop()):
+                if self.store.add(h):
+                    self.derived[h[1]].add(h)
+                    new.add(h)
+                    delta.append(h)
+        return new
+
+    def retract(self, facts: Iterable[Fact]) -> Set[Fact]:
+        """
+        Delete/rederive: remove base `facts`, over-delete every derived fact
+        that may rest on them, then restore those that still have another
+        derivation. Returns the derived facts that are really gone.
+        """
+        # Only asserted facts can be retracted; a derived one stays while it holds
+        facts = [f for f in facts if f in self.store and f not in self.derived.get(f[1], ())]
+        # Over-delete while the store still holds the old state
+        over: Set[Fact] = set()
+        delta = list(facts)
+        while delta:
+            for h in self.consequences(delta.pop()):
+                if h not in over and h in self.derived.get(h[1], ()):
+                    over.add(h)
+                    delta.append(h)
+        for f in facts:
+            self.store.discard(f)
+        for h in over:
+            self.store.discard(h)
+            self.derived[h[1]].discard(h)
+        # Rederive survivors (retracted facts some rule still derives included),
+        # then whatever they support
+        back = [h for h in facts + list(over) if self.derivable(h)]
+        for h in back:
+            self.store.add(h)
+            self.derived[h[1]].add(h)
+        self.derive(back)
+        return {h for h in over if h not in self.store}
+
+    def update(self, added: Iterable[Fact], removed: Iterable[Fact]) -> Tuple[Set[Fact], Set[Fact]]:
+        """Apply base-fact deltas; returns the derived facts that entered and left the store."""
+        removed = set(removed)
+        lost = self.retract(removed)
+        new = []
+        for f in added:
+            if f in self.derived.get(f[1], ()):
+                self.derived[f[1]].discard(f)  # now asserted as well
+            elif self.store.add(f):
+                new.append(f)
+        gained = self.derive(new)
+        return net_changes(self, gained, lost, removed)
+
+# ----------------------------
+# Rete network
+# ----------------------------
+# Inside the network, rule variables are renumbered 0, 1, 2... in order of
+# first appearance, so a token is just the tuple of values bound so far and
+# rules whose atoms match up to renaming share alpha and beta memories.
+
+def is_recursive(rules: List[CompiledRule]) -> bool:
+    """Whether some rule head can feed back (directly or not) into its own body."""
+    feeds: Dict[str, Set[str]] = defaultdict(set)
+    for r in rules:
+        for b in r.body:
+            feeds[b[0]].update(h[0] for h in r.head)
+    for start in feeds:
+        seen, todo = set(), list(feeds[start])
+        while todo:
+            p = todo.pop()
+            if p == start:
+                return True
+            if p not in seen:
+                seen.add(p)
+                todo.extend(feeds.get(p, ()))
+    return False
+
+def _rete_order(body: List[Fact]) -> List[Fact]:
+    """Join order: filters first, then atoms connected to what is bound; ties by predicate name."""
+    order, bound, rest = [], set(), list(body)
+    while rest:
+        def key(a):
+            vars_ = {t for t in a[1:] if t is not None and is_var(t)}
+            connected = bool(vars_ & bound) or not bound
+            return (len(vars_ - bound), not connected, a[0], str(a))
+        atom = min(rest, key=key)
+        rest.remove(atom)
+        order.append(atom)
+        bound.update(t for t in atom[1:] if t is not None and is_var(t))
+    return order
+
+class AlphaMemory:
+    """Facts matching one atom pattern, indexed on demand by argument positions."""
+
+    def __init__(self, pattern: Tuple):
+        self.pattern = pattern  # (pred, term, term); terms: constant, local var label, or None
+        self.facts: Set[Fact] = set()
+        self.successors: List["JoinNode"] = []
+        self.indexes: Dict[Tuple[int, ...], Dict[Tuple, Set[Fact]]] = {}
+
+    def matches(self, fact: Fact) -> bool:
+        seen: Dict[str, Any] = {}
+        for t, v in zip(self.pattern[1:], fact[1:]):
+            if isinstance(t, str):
+                if seen.setdefault(t, v) != v:
+                    return False
+            elif t != v:
+                return False
+        return True
+
+    def lookup(self, positions: Tuple[int, ...], key: Tuple) -> Iterable[Fact]:
+        if not positions:
+            return self.facts
+        index = self.indexes.get(positions)
+        if index is None:
+            index = self.indexes[positions] = defaultdict(set)
+            for f in self.facts:
+                index[tuple(f[p] for p in positions)].add(f)
+        return index.get(key, ())
+
+    def add(self, fact: Fact):
+        self.facts.add(fact)
+        for positions, index in self.indexes.items():
+            index[tuple(fact[p] for p in positions)].add(fact)
+
+    def remove(self, fact: Fact):
+        self.facts.discard(fact)
+        for positions, index in self.indexes.items():
+            index[tuple(fact[p] for p in positions)].discard(fact)
+
+class BetaMemory:
+    """Partial matches (tokens) of a rule-body prefix."""
+
+    def __init__(self):
+        self.tokens: Set[Tuple] = set()
+        self.children: List["JoinNode"] = []
+        self.productions: List["Production"] = []
+        self.indexes: Dict[Tuple[int, ...], Dict[Tuple, Set[Tuple]]] = {}
+
+    def lookup(self, var_ids: Tuple[int, ...], key: Tuple) -> Iterable[Tuple]:
+        if not var_ids:
+            return self.tokens
+        index = self.indexes.get(var_ids)
+        if index is None:
+            index = self.indexes[var_ids] = defaultdict(set)
+            for tok in self.tokens:
+                index[tuple(tok[v] for v in var_ids)].add(tok)
+        return index.get(key, ())
+
+    def add(self, tok: Tuple) -> bool:
+        if tok in self.tokens:
+            return False
+        self.tokens.add(tok)
+        for var_ids, index in self.indexes.items():
+            index[tuple(tok[v] for v in var_ids)].add(tok)
+        return True
+
+    def remove(self, tok: Tuple) -> bool:
+        if tok not in self.tokens:
+            return False
+        self.tokens.discard(tok)
+        for var_ids, index in self.indexes.items():
+            index[tuple(tok[v] for v in var_ids)].discard(tok)
+        return True
+
+class JoinNode:
+    """Joins the tokens of `parent` with the facts of `alpha` into `child`."""
+
+    def __init__(self, network: "ReteNetwork", parent: BetaMemory, alpha: AlphaMemory, atom: Tuple, width: int):
+        self.network = network
+        self.parent = parent
+        self.alpha = alpha
+        self.child = BetaMemory()
+        # (fact position, var id) for variables the parent token already binds
+        self.bound = [(i, t) for i, t in enumerate(atom) if i and isinstance(t, int) and t < width]
+        self.positions = tuple(i for i, _ in self.bound)
+        self.var_ids = tuple(v for _, v in self.bound)
+        # fact positions of the variables this atom binds first, in var id order
+        new = {t: i for i, t in enumerate(atom) if i and isinstance(t, int) and t >= width}
+        self.new_positions = [new[v] for v in sorted(new)]
+
+    def _extend(self, tok: Tuple, fact: Fact) -> Tuple:
+        return tok + tuple(fact[p] for p in self.new_positions)
+
+    def left(self, tok: Tuple, add: bool):
+        key = tuple(tok[v] for v in self.var_ids)
+        for fact in list(self.alpha.lookup(self.positions, key)):
+            self.network.propagate(self.child, self._extend(tok, fact), add)
+
+    def right(self, fact: Fact, add: bool):
+        key = tuple(fact[p] for p in self.positions)
+        for tok in list(self.parent.lookup(self.var_ids, key)):
+            self.network.propagate(self.child, self._extend(tok, fact), add)
+
+class Production:
+    """Instantiates rule heads for every complete token."""
+
+    def __init__(self, heads: List[Tuple]):
+        self.heads = heads
+
+    def facts(self, tok: Tuple) -> List[Fact]:
+        return [(h[0],) + tuple(tok[t] if isinstance(t, int) else t for t in h[1:]) for h in self.heads]
+
+class ReteNetwork:
+    """
+    Rete matcher for non-recursive SWRL rule sets. Alpha memories are shared
+    by every atom with the same pattern and beta memories by every rule with
+    the same body prefix, so a new rule over existing atoms adds little work.
+    Derived facts carry support counts and disappear with their last match.
+    """
+
+    def __init__(self, store: FactStore, rules: List[CompiledRule]):
+        self.store = store
+        self.rules = rules
+        self.heads = {a[0] for r in rules for a in r.head}
+        self.derived: Dict[Any, Set[Fact]] = defaultdict(set)
+        self.support: Dict[Fact, int] = defaultdict(int)
+        self.alphas: Dict[Tuple, AlphaMemory] = {}
+        self.alphas_by_pred: Dict[str, List[AlphaMemory]] = defaultdict(list)
+        self.betas: Dict[Tuple, BetaMemory] = {}
+        self.root = BetaMemory()
+        self.root.add(())
+        self._gained: Set[Fact] = set()
+        self._lost: Set[Fact] = set()
+        for r in rules:
+            self._compile(r)
+
+    def _alpha(self, atom: Tuple) -> AlphaMemory:
+        labels: Dict[int, str] = {}
+        pattern = (atom[0],) + tuple(
+            labels.setdefault(t, "v%d" % len(labels)) if isinstance(t, int) else t for t in atom[1:]
+        )
+        alpha = self.alphas.get(pattern)
+        if alpha is None:
+            alpha = self.alphas[pattern] = AlphaMemory(pattern)
+            self.alphas_by_pred[atom[0]].append(alpha)
+        return alpha
+
+    def _compile(self, rule: CompiledRule):
+        ids: Dict[str, int] = {}
+
+        def canon(a: Fact) -> Tuple:
+            return (a[0],) + tuple(
+                None if t is None else ids.setdefault(t, len(ids)) if is_var(t) else t for t in a[1:]
+            )
+
+        parent, prefix = self.root, ()
+        for atom in _rete_order(rule.body):
+            width = len(ids)
+            c = canon(atom)
+            prefix += (c,)
+            mem = self.betas.get(prefix)
+            if mem is None:
+                node = JoinNode(self, parent, self._alpha(c), c, width)
+                parent.children.append(node)
+                node.alpha.successors.append(node)
+                mem = self.betas[prefix] = node.child
+            parent = mem
+        parent.productions.append(Production([canon(h) for h in rule.head]))
+
+    def propagate(self, mem: BetaMemory, tok: Tuple, add: bool):
+        if not (mem.add(tok) if add else mem.remove(tok)):
+            return
+        for child in mem.children:
+            child.left(tok, add)
+        for prod in mem.productions:
+            for fact in prod.facts(tok):
+                if add:
+                    self._support(fact)
+                else:
+                    self._unsupport(fact)
+
+    def _activate(self, fact: Fact, add: bool):
+        for alpha in self.alphas_by_pred.get(fact[0], ()):
+            if alpha.matches(fact):
+                if add:
+                    alpha.add(fact)
+                else:
+                    alpha.remove(fact)
+                for node in alpha.successors:
+                    node.right(fact, add)
+
+    def _support(self, fact: Fact):
+        self.support[fact] += 1
+        if self.support[fact] == 1 and self.store.add(fact):
+            self.derived[fact[1]].add(fact)
+            self._gained.add(fact)
+            self._activate(fact, True)
+
+    def _unsupport(self, fact: Fact):
+        self.support[fact] -= 1
+        if self.support[fact] > 0:
+            return
+        del self.support[fact]
+        if fact in self.derived.get(fact[1], ()):
+            self.derived[fact[1]].discard(fact)
+            self.store.discard(fact)
+            self._lost.add(fact)
+            self._activate(fact, False)
+
+    def update(self, added: Iterable[Fact], removed: Iterable[Fact]) -> Tuple[Set[Fact], Set[Fact]]:
+        """Apply base-fact deltas; returns the derived facts that entered and left the store."""
+        self._gained, self._lost = set(), set()
+        removed = set(removed)
+        for f in removed:
+            if f not in self.store or f in self.derived.get(f[1], ()):
+                continue
+            if self.support.get(f):
+                self.derived[f[1]].add(f)  # no longer asserted, still derived
+                continue
+            self.store.discard(f)
+            self._activate(f, False)
+        for f in added:
+            if f in self.derived.get(f[1], ()):
+                self.derived[f[1]].discard(f)  # now asserted as well
+            elif self.store.add(f):
+                self._activate(f, True)
+        return net_changes(self, self._gained, self._lost, removed)
+
+    def stats(self) -> dict:
+        return {
+            "alpha_memories": len(self.alphas),
+            "beta_memories": len(self.betas),
+            "tokens": sum(len(m.tokens) for m in self.betas.values()),
+        }
+
+def build_engine(rules: List[CompiledRule]):
+    """A Rete network over an empty store, or the semi-naive engine for recursive rule sets."""
+    engine_cls = RuleEngine if is_recursive(rules) else ReteNetwork
+    return engine_cls(FactStore(), rules)
@@ -0,0 +1,89 @@
+"""
+Full-text search over the catalog: BM25 ranking and prefix suggestions.
+"""
+import heapq
+import math
+import re
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from catalog import Catalog
+
+TOKEN_RE = re.compile(r"\w+")
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+class TrieNode:
+    __slots__ = ("children", "top")
+
+    def __init__(self):
+        self.children: Dict[str, "TrieNode"] = {}
+        self.top: List[str] = []  # best completions below this node
+
+class SearchIndex:
+    """
+    BM25 over concepts (code, label, description) and problems (label, text),
+    with an inverted index term -> [(document, term frequency)], and a prefix
+    trie of the vocabulary whose nodes keep their top completions, so a
+    suggestion costs one walk down the prefix.
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, cat: Catalog, max_completions: int = 50):
+        self.documents: List[dict] = []
+        texts: List[List[str]] = []
+        for d in cat.concepts:
+            self.documents.append({"type": "concept", "code": d["code"], "label": d["label"]})
+            texts.append(tokenize(d["code"].replace("_", " ")) + tokenize(d["label"]) + tokenize(d["description"]))
+        for d in cat.problems:
+            self.documents.append({"type": "problem", "iri": d["iri"], "label": d["label"],
+                                   "concept_code": d["concept_code"]})
+            texts.append(tokenize(d["label"]) + tokenize(d["text"]))
+
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        for doc, tokens in enumerate(texts):
+            counts: Dict[str, int] = defaultdict(int)
+            for t in tokens:
+                counts[t] += 1
+            for t, tf in counts.items():
+                self.postings[t].append((doc, tf))
+        n = len(texts)
+        avg = sum(len(t) for t in texts) / n if n else 0.0
+        self.idf = {t: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)) for t, p in self.postings.items()}
+        # BM25 length normalization, folded in once per document
+        self.norm = [self.K1 * (1 - self.B + self.B * len(t) / avg) if avg else self.K1 for t in texts]
+
+        self.trie = TrieNode()
+        for term in sorted(self.postings, key=lambda t: (-len(self.postings[t]), t)):
+            node = self.trie
+            for ch in term:
+                node = node.children.setdefault(ch, TrieNode())
+                if len(node.top) < max_completions:
+                    node.top.append(term)
+
+    def complete(self, prefix: str, limit: int) -> List[str]:
+        """Vocabulary terms starting with `prefix`, most common first."""
+        node = self.trie
+        for ch in prefix.lower():
+            node = node.children.get(ch)
+            if node is None:
+                return []
+        return node.top[:limit]
+
+    def search(self, query: str, limit: int) -> List[dict]:
+        terms = tokenize(query)
+        if terms and terms[-1] not in self.postings:
+            # the last word may still be being typed
+            terms[-1:] = self.complete(terms[-1], 5)
+        scores: Dict[int, float] = defaultdict(float)
+        for t in dict.fromkeys(terms):
+            idf = self.idf.get(t)
+            if idf is None:
+                continue
+            for doc, tf in self.postings[t]:
+                scores[doc] += idf * tf * (self.K1 + 1) / (tf + self.norm[doc])
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [{**self.documents[doc], "score": round(score, 4)} for doc, score in best]
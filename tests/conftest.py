@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+# The backend modules live at the repository root, next to main.py
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+@pytest.fixture(scope="session")
+def app_module():
+    # main loads geometry-its.owl relative to the repository root
+    cwd = os.getcwd()
+    os.chdir(ROOT)
+    try:
+        import main
+    finally:
+        os.chdir(cwd)
+    return main
+
+@pytest.fixture(scope="session")
+def client(app_module):
+    from fastapi.testclient import TestClient
+    return TestClient(app_module.app)
@@ -0,0 +1,185 @@
+"""
+The concept and problem catalog, on its own and through the /concepts and
+/problems endpoints of the app, and its rebuild on /admin/reload.
+"""
+import gzip
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from catalog import Catalog, ColumnTable, StaticBody, accepted_coding, etag_matches, json_bytes
+
+CONCEPTS = [
+    {"iri": f"urn:c{i}", "code": f"c{i}", "label": f"Concept {i}", "description": "x" * 200,
+     "difficulty": i % 3, "ks_level": 3, "prerequisites": [], "image_key": f"c{i}"}
+    for i in range(5)
+]
+PROBLEMS = [
+    {"iri": f"urn:p{i}", "label": f"Problem {i}", "text": "Find the angle.", "correct_answer": "90",
+     "concept_code": f"c{i % 2}"}
+    for i in range(4)
+]
+
+@pytest.fixture
+def cat():
+    return Catalog(CONCEPTS, PROBLEMS, "v1")
+
+# ----------------------------
+# Pre-serialized bodies
+# ----------------------------
+def test_concept_bodies(cat):
+    assert json.loads(cat.concepts_body.body) == CONCEPTS
+    assert json.loads(cat.concept_bodies["c3"].body) == CONCEPTS[3]
+
+# ----------------------------
+# Problems by concept
+# ----------------------------
+def test_problem_bodies(cat):
+    assert json.loads(cat.concept_problems_bodies["c1"].body) == [PROBLEMS[1], PROBLEMS[3]]
+    assert cat.problems_by_concept["c0"] == [0, 2]
+    assert json.loads(cat.no_problems_body.body) == []
+
+# ----------------------------
+# Validators
+# ----------------------------
+def test_static_body_etag():
+    body = StaticBody(json_bytes(CONCEPTS), "v1")
+    assert body.etag.startswith('"v1-')
+    assert StaticBody(json_bytes(CONCEPTS), "v2").etag != body.etag
+
+def test_etag_matches():
+    assert etag_matches('"a"', '"a"')
+    assert etag_matches('W/"a"', '"a"')
+    assert etag_matches('"b", "a"', '"a"')
+    assert etag_matches("*", '"a"')
+    assert not etag_matches('"b"', '"a"')
+    assert not etag_matches(None, '"a"')
+
+def test_conditional_get(client):
+    r = client.get("/concepts", headers={"accept-encoding": "identity"})
+    assert r.status_code == 200 and "ETag" in r.headers and "Cache-Control" in r.headers
+    etag = r.headers["ETag"]
+    for tag in (etag, "W/" + etag, f'"other", {etag}'):
+        r2 = client.get("/concepts", headers={"accept-encoding": "identity", "if-none-match": tag})
+        assert r2.status_code == 304 and r2.content == b"" and r2.headers["ETag"] == etag
+    assert client.get("/concepts", headers={"if-none-match": '"other"'}).status_code == 200
+
+# ----------------------------
+# Content codings
+# ----------------------------
+def test_static_body_variants():
+    body = StaticBody(json_bytes(CONCEPTS), "v1")
+    packed, etag = body.variants["gzip"]
+    assert gzip.decompress(packed) == body.body
+    assert etag != body.etag and etag.endswith('-gzip"')
+    # Too small to shrink: served as is
+    assert StaticBody(b"[]", "v1").variants == {}
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("gzip", "gzip"),
+    ("gzip, deflate", "gzip"),
+    ("gzip;q=0", None),
+    ("*", "gzip"),
+    ("*, gzip;q=0", None),
+    ("identity", None),
+    ("br;q=1, gzip;q=0.5", "gzip"),
+])
+def test_accepted_coding(header, expected):
+    assert accepted_coding(header, ["gzip"]) == expected
+
+def test_gzip_variant(client):
+    plain = client.get("/concepts", headers={"accept-encoding": "identity"})
+    packed = client.get("/concepts", headers={"accept-encoding": "gzip"})
+    assert "Content-Encoding" not in plain.headers
+    assert packed.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in packed.headers["Vary"]
+    assert packed.headers["ETag"] != plain.headers["ETag"]
+    assert packed.content == plain.content  # decoded by the client
+    # The identity validator does not match the gzip representation
+    r = client.get("/concepts", headers={"accept-encoding": "gzip", "if-none-match": plain.headers["ETag"]})
+    assert r.status_code == 200
+
+# ----------------------------
+# Projection and cursors
+# ----------------------------
+def test_cursor_round_trip(cat):
+    assert cat.decode_cursor(cat.encode_cursor("concepts", 42), "concepts") == 42
+
+@pytest.mark.parametrize("cursor", [
+    "not-a-cursor",
+    "",
+    Catalog([], [], "v2").encode_cursor("concepts", 1),  # another ontology version
+    Catalog([], [], "v1").encode_cursor("problems", 1),  # another listing
+    Catalog([], [], "v1").encode_cursor("concepts", -1),
+])
+def test_invalid_cursor(cat, cursor):
+    with pytest.raises(HTTPException) as e:
+        cat.decode_cursor(cursor, "concepts")
+    assert e.value.status_code == 400
+
+def test_column_table_projection():
+    table = ColumnTable(CONCEPTS)
+    assert table.project(None) == list(CONCEPTS[0])
+    assert table.project(" label ,code") == ["code", "label"]
+    assert json.loads(table.render([4, 1], ["code", "label"])) == [
+        {"code": "c4", "label": "Concept 4"}, {"code": "c1", "label": "Concept 1"}]
+    for fields in ("", " , ", "code,nope"):
+        with pytest.raises(HTTPException) as e:
+            table.project(fields)
+        assert e.value.status_code == 400
+
+@pytest.mark.parametrize("path", ["/concepts", "/problems"])
+def test_cursor_pagination_covers_listing(client, path):
+    everything = client.get(path).json()
+    items, cursor, pages = [], None, 0
+    while True:
+        url = f"{path}?limit=3" + (f"&cursor={cursor}" if cursor else "")
+        page = client.get(url)
+        assert page.status_code == 200 and "ETag" in page.headers and "Cache-Control" in page.headers
+        body = page.json()
+        items += body["items"]
+        pages += 1
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert items == everything
+    assert pages == max(1, -(-len(everything) // 3))
+
+def test_pages_revalidate(client):
+    r = client.get("/concepts?limit=2&fields=code")
+    again = client.get("/concepts?limit=2&fields=code", headers={"if-none-match": r.headers["ETag"]})
+    assert again.status_code == 304
+    other = client.get("/concepts?limit=2&fields=label")
+    assert other.headers["ETag"] != r.headers["ETag"]
+
+def test_bad_pagination_requests(client):
+    assert client.get("/concepts?cursor=garbage").status_code == 400
+    cursor = client.get("/concepts?limit=1").json()["next_cursor"]
+    assert client.get(f"/problems?cursor={cursor}").status_code == 400
+    assert client.get("/concepts?fields=").status_code == 400
+    assert client.get("/concepts?fields=nope").status_code == 400
+    assert client.get("/concepts?limit=0").status_code == 422
+
+# ----------------------------
+# Ontology reload
+# ----------------------------
+def test_admin_reload(app_module, client):
+    main = app_module
+    main.update_student_in_ontology("reloaded", ["point", "line"])
+    etag = client.get("/concepts").headers["ETag"]
+    world = main.onto.world
+
+    r = client.post("/admin/reload").json()
+    assert r == {"ontology_version": main.ONTO_VERSION, "changed": False, "students": len(main.student_cache)}
+    assert main.onto.world is not world
+    assert main.recommendation_cache.stats()["size"] == 0
+    # Same file, same version: validators still hold
+    assert client.get("/concepts", headers={"if-none-match": etag}).status_code == 304
+    # Students are re-created in the new world and reasoned on their next read
+    s = main.get_or_create_student("reloaded")
+    assert {c.hasConceptCode[0] for c in s.knowsConcept} == {"point", "line"}
+    body = client.get("/recommend/reloaded").json()
+    assert sorted(c["code"] for c in body["concepts"]) == \
+        sorted(c["code"] for c in main.preview_recommendations(["point", "line"]))
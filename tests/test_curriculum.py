@@ -0,0 +1,131 @@
+"""
+Prerequisite edges and closures, missing sets, learning-path layers and
+curriculum plans over a small graph with a prerequisite cycle, and the
+endpoints built on them.
+"""
+import pytest
+
+from catalog import Catalog
+from curriculum import CurriculumPlanner, PrerequisiteGraph
+
+# a <- b, a <- c, (b, c) <- d <- e, and the cycle x <-> y <- z
+PREREQUISITES = {"a": [], "b": ["a"], "c": ["a"], "d": ["b", "c"], "e": ["d"], "x": ["y"], "y": ["x"], "z": ["y"]}
+
+def concept(code: str, prerequisites):
+    return {"iri": f"urn:{code}", "code": code, "label": code.upper(), "description": "", "difficulty": 1,
+            "ks_level": 3, "prerequisites": prerequisites, "image_key": code}
+
+# Only a has a practice problem, so it is the one concept without the no-problem penalty
+PROBLEMS = [{"iri": "urn:p", "label": "P", "text": "", "correct_answer": "1", "concept_code": "a"}]
+
+@pytest.fixture
+def cat():
+    return Catalog([concept(code, pre) for code, pre in PREREQUISITES.items()], PROBLEMS, "v1")
+
+@pytest.fixture
+def graph(cat):
+    return PrerequisiteGraph(cat)
+
+def test_csr_edges():
+    # Duplicate and unknown prerequisite codes are dropped
+    cat = Catalog([concept("a", []), concept("b", ["a", "a", "nope"]), concept("c", ["b", "a"])], [], "v1")
+    graph = PrerequisiteGraph(cat)
+    assert list(graph.prereq_off) == [0, 0, 1, 3]
+    assert list(graph.prereq_idx) == [0, 1, 0]
+    assert list(graph.neighbours(0, reverse=True)) == [1, 2]
+    assert graph.related("c", reverse=False, transitive=False) == ["a", "b"]
+    assert graph.related("a", reverse=True, transitive=False) == ["b", "c"]
+
+def test_concept_edge_endpoints(client):
+    assert client.get("/concept/angle/prerequisites").json()["prerequisites"] == ["ray"]
+    assert client.get("/concept/angle/prerequisites?transitive=true").json()["prerequisites"] == ["point", "line", "ray"]
+    assert "angles_straight_line" in client.get("/concept/angle/dependents").json()["dependents"]
+    assert client.get("/concept/nope/dependents").status_code == 404
+
+def test_transitive_closures(graph):
+    assert graph.related("e", reverse=False, transitive=True) == ["a", "b", "c", "d"]
+    assert graph.related("a", reverse=True, transitive=True) == ["b", "c", "d", "e"]
+    assert graph.related("a", reverse=False, transitive=True) == []
+    # Members of a cycle are their own ancestors
+    assert graph.related("x", reverse=False, transitive=True) == ["x", "y"]
+    assert graph.related("z", reverse=False, transitive=True) == ["x", "y"]
+    assert graph.related("y", reverse=True, transitive=True) == ["x", "y", "z"]
+
+@pytest.mark.parametrize("target, known, missing", [
+    ("e", [], ["a", "b", "c", "d"]),
+    # Knowing b covers a, its own prerequisite
+    ("e", ["b"], ["c", "d"]),
+    ("e", ["d"], []),
+    ("e", ["e"], []),
+    ("e", ["nope", "x"], ["a", "b", "c", "d"]),
+    ("z", [], ["x", "y"]),
+    ("z", ["x"], []),
+])
+def test_missing_prerequisites(graph, target, known, missing):
+    assert graph.missing_prerequisites(target, known) == missing
+
+def test_missing_prerequisites_read_the_ontology(client):
+    # Student_Example is asserted in the ontology: angle, line, angles_straight_line
+    r = client.get("/student/Example/missing-prerequisites?target=triangle_sum")
+    assert r.json()["missing"] == ["segment", "polygon", "triangle"]
+    r = client.get("/student/Example/missing-prerequisites?target=angles_straight_line")
+    assert r.json()["missing"] == []
+    assert client.get("/student/Example/missing-prerequisites?target=nope").status_code == 404
+
+def layer_codes(graph, layers):
+    return [[graph.codes[i] for i in layer] for layer in layers]
+
+@pytest.mark.parametrize("target, known, layers", [
+    ("e", [], [["a"], ["b", "c"], ["d"], ["e"]]),
+    ("e", ["b"], [["c"], ["d"], ["e"]]),
+    ("e", ["e"], []),
+    # The cycle is entered at one member; z follows the member it needs
+    ("z", [], [["y"], ["x", "z"]]),
+])
+def test_layers(graph, target, known, layers):
+    assert layer_codes(graph, graph.layers(target, known)) == layers
+
+def test_path_reads_the_ontology(client):
+    r = client.get("/student/Example/path?target=triangle_sum")
+    assert [[d["code"] for d in layer] for layer in r.json()["layers"]] == \
+        [["segment"], ["polygon"], ["triangle"], ["triangle_sum"]]
+    # The target itself is known
+    assert client.get("/student/Example/path?target=angles_straight_line").json()["layers"] == []
+
+class DictCache(dict):
+    def put(self, key, value):
+        self[key] = value
+
+@pytest.fixture
+def planner(graph, cat):
+    # difficulty 1 + 0.5 * ks_level 3, plus 2 without a problem: a costs 2.5, the rest 4.5
+    return CurriculumPlanner(graph, cat, DictCache())
+
+def test_plan(planner):
+    plan = planner.plan("e", [])
+    assert [s["code"] for s in plan["steps"]] == ["a", "b", "c", "d", "e"]
+    assert plan["total_cost"] == 2.5 + 4 * 4.5
+    assert plan["critical_path"] == ["a", "b", "d", "e"]
+    assert plan["critical_cost"] == 2.5 + 3 * 4.5
+    assert [s["code"] for s in planner.plan("e", ["b"])["steps"]] == ["c", "d", "e"]
+    assert planner.plan("e", ["e"])["steps"] == []
+
+def test_plan_through_a_cycle(planner):
+    plan = planner.plan("z", [])
+    assert sorted(s["code"] for s in plan["steps"]) == ["x", "y", "z"]
+    assert plan["steps"][-1]["code"] == "z" and plan["critical_path"][-1] == "z"
+
+def test_class_plans_share_knowledge_states(planner):
+    plans = planner.plan_class("e", {"s1": ["b"], "s2": ["b", "x"], "s3": []})
+    # x does not matter for e
+    assert plans["s1"] is plans["s2"]
+    assert [s["code"] for s in plans["s3"]["steps"]] == ["a", "b", "c", "d", "e"]
+    assert len(planner.cache) == 2
+
+def test_plans_read_the_ontology(client):
+    plan = client.get("/student/Example/plan?target=triangle_sum").json()
+    assert sorted(s["code"] for s in plan["steps"]) == ["polygon", "segment", "triangle", "triangle_sum"]
+    r = client.post("/plan/class", json={"target": "triangle_sum", "student_ids": ["Example", "planless"]})
+    students = r.json()["students"]
+    assert students[0]["steps"] == plan["steps"]
+    assert len(students[1]["steps"]) == 9
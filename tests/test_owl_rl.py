@@ -0,0 +1,69 @@
+"""
+The OWL 2 RL schema rules over a small ontology, and the request-path
+defaults of HermiT mode when the RL engine stands in for it.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from owlready2 import DataProperty, ObjectProperty, Thing, World
+
+from conftest import ROOT
+from owl_rl import quadstore_facts, rl_profile_violations, rl_schema_rules
+from rule_engine import build_engine
+
+@pytest.fixture
+def onto():
+    onto = World().get_ontology("http://example.org/rl.owl")
+    with onto:
+        class Concept(Thing): pass
+        class Basic(Concept): pass
+        class Student(Thing): pass
+        class knows(ObjectProperty):
+            domain = [Student]
+            range = [Concept]
+        class code(DataProperty):
+            domain = [Basic]
+            range = [str]
+        s = Thing("s")
+        c = Thing("c")
+        tagged = Thing("tagged")
+    s.knows = [c]
+    tagged.code = ["x"]
+    return onto
+
+def materialize(onto):
+    engine = build_engine(rl_schema_rules(onto))
+    engine.update(quadstore_facts(onto), [])
+    return engine.store
+
+def test_domains_and_ranges(onto):
+    store = materialize(onto)
+    assert rl_profile_violations(onto) == []
+    assert ("Student", onto.s, None) in store
+    assert ("Concept", onto.c, None) in store
+    # Data-property domains type their subjects too, through cax-sco as well
+    assert ("Basic", onto.tagged, None) in store
+    assert ("Concept", onto.tagged, None) in store
+    assert ("Basic", onto.c, None) not in store
+
+def test_quadstore_facts_for_one_individual(onto):
+    facts = quadstore_facts(onto, onto.tagged)
+    assert ("code", onto.tagged, "x") in facts
+    assert all(f[1] is onto.tagged for f in facts)
+    assert ("code", onto.tagged, "x") not in quadstore_facts(onto, onto.tagged, skip={"code"})
+
+def reasoning_defaults(**env):
+    code = "import json, main; print(json.dumps([main.active_backend().name, " \
+           "main.REASONING_DEADLINE_MS, main.REASONING_BATCH_WINDOW_MS]))"
+    env = {k: v for k, v in os.environ.items() if not k.startswith("ITS_")} | env
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def test_defaults_follow_the_backend_that_reasons():
+    # HermiT mode on the RL fast path reasons in-process: no deadline, no batching
+    assert reasoning_defaults(ITS_REASONER="hermit") == ["rl", 0.0, 0.0]
+    assert reasoning_defaults(ITS_REASONER="hermit", ITS_RL_FASTPATH="0") == ["hermit", 2000.0, 5.0]
+    assert reasoning_defaults(ITS_REASONER="hermit", ITS_BATCH_WINDOW_MS="7") == ["rl", 0.0, 7.0]
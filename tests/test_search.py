@@ -0,0 +1,70 @@
+"""
+BM25 ranking and prefix suggestions over a small catalog, and the /search
+endpoints of the app.
+"""
+import math
+
+import pytest
+
+from catalog import Catalog
+from search import SearchIndex, tokenize
+
+def concept(code: str, label: str, description: str):
+    return {"iri": f"urn:{code}", "code": code, "label": label, "description": description, "difficulty": 1,
+            "ks_level": 3, "prerequisites": [], "image_key": code}
+
+CONCEPTS = [
+    concept("right_angle", "Right angle", "An angle of exactly 90 degrees."),
+    concept("acute_angle", "Acute angle", "An angle smaller than a right angle."),
+    concept("circle", "Circle", "All points at the same distance from the centre."),
+]
+PROBLEMS = [
+    {"iri": "urn:p0", "label": "Circle area", "text": "Find the area of a circle of radius 2.",
+     "correct_answer": "4pi", "concept_code": "circle"},
+]
+
+@pytest.fixture
+def index():
+    return SearchIndex(Catalog(CONCEPTS, PROBLEMS, "v1"))
+
+def bm25(term: str, doc: int) -> float:
+    """BM25 of one term in one document, straight from the definition."""
+    texts = [tokenize(c["code"].replace("_", " ")) + tokenize(c["label"]) + tokenize(c["description"])
+             for c in CONCEPTS] + [tokenize(p["label"]) + tokenize(p["text"]) for p in PROBLEMS]
+    n, avg = len(texts), sum(map(len, texts)) / len(texts)
+    df = sum(1 for t in texts if term in t)
+    tf = texts[doc].count(term)
+    idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+    k1, b = SearchIndex.K1, SearchIndex.B
+    return idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(texts[doc]) / avg))
+
+def test_scores_follow_bm25(index):
+    results = index.search("angle", 10)
+    # The shorter description weighs its one "angle" more
+    assert [r["code"] for r in results] == ["acute_angle", "right_angle"]
+    for r, doc in zip(results, (1, 0)):
+        assert r["score"] == round(bm25("angle", doc), 4)
+
+def test_problems_are_searchable(index):
+    results = index.search("area", 10)
+    assert results == [{"type": "problem", "iri": "urn:p0", "label": "Circle area", "concept_code": "circle",
+                        "score": results[0]["score"]}]
+
+def test_last_word_is_completed(index):
+    assert [r["code"] for r in index.search("right ang", 10)][0] == "right_angle"
+    assert index.search("zzz", 10) == []
+    assert len(index.search("angle", 1)) == 1
+
+def test_complete(index):
+    # Most common terms first (by document count), then alphabetical
+    assert index.complete("a", 10) == ["a", "an", "angle", "acute", "all", "area", "at"]
+    assert index.complete("a", 2) == ["a", "an"]
+    assert index.complete("CI", 10) == ["circle"]
+    assert index.complete("x", 10) == []
+
+def test_search_endpoints(client):
+    results = client.get("/search?q=right angle").json()["results"]
+    assert results[0]["code"] == "right_angle"
+    assert "right_angle" in [r.get("code") for r in client.get("/search?q=right ang").json()["results"]]
+    assert "angle" in client.get("/search/suggest?q=ang").json()["suggestions"]
+    assert client.get("/search?q=angle&limit=0").status_code == 422
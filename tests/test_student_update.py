@@ -0,0 +1,188 @@
+"""
+/student/update and the reasoning paths behind it: knowsConcept deltas and
+their inferences under concurrent updates of the same students.
+"""
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from owlready2 import ObjectProperty, World
+
+from conftest import ROOT
+
+CODES = ["point", "line", "segment", "ray", "angle", "acute_angle", "right_angle", "polygon", "triangle"]
+
+def random_states(n: int, seed: int):
+    rnd = random.Random(seed)
+    return [rnd.sample(CODES, rnd.randint(0, len(CODES))) for _ in range(n)]
+
+def known_codes(main, student_id: str):
+    s = main.get_or_create_student(student_id)
+    return {str(main.first_literal(c, "hasConceptCode")) for c in s.knowsConcept}
+
+def test_concurrent_deltas_of_one_student(app_module):
+    main = app_module
+    students = [f"delta{i}" for i in range(3)]
+    updates = [(students[i % 3], codes) for i, codes in enumerate(random_states(240, 3))]
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # switch threads often enough to interleave the deltas
+    try:
+        with ThreadPoolExecutor(16) as pool:
+            # Any delta computed from stale edges raises from list.remove
+            list(pool.map(lambda u: main.update_student_in_ontology(*u), updates))
+    finally:
+        sys.setswitchinterval(interval)
+    for sid in students:
+        assert known_codes(main, sid) == set(main.student_cache[sid])
+
+def test_delta_waits_for_the_reasoner_lock(app_module):
+    main = app_module
+    main.update_student_in_ontology("locked", [])
+    with main.reasoner_lock:
+        t = threading.Thread(target=main.update_student_in_ontology, args=("locked", ["point", "line"]))
+        t.start()
+        t.join(0.2)
+        # The edges are read and changed inside the critical section only
+        assert t.is_alive() and known_codes(main, "locked") == set()
+    t.join()
+    assert known_codes(main, "locked") == {"point", "line"}
+
+def rec_codes(recs):
+    return sorted(r["code"] for r in recs)
+
+def test_concurrent_updates_cache_their_own_recommendations(app_module, client):
+    main = app_module
+    main.recommendation_cache.clear()
+    updates = [(f"cache{i % 4}", codes) for i, codes in enumerate(random_states(160, 5))]
+
+    def post(u):
+        sid, codes = u
+        r = client.post("/student/update", json={"student_id": sid, "known_concepts": codes})
+        assert r.status_code == 200
+        return codes, r.json()
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(16) as pool:
+            results = list(pool.map(post, updates))
+    finally:
+        sys.setswitchinterval(interval)
+    # Each response and each cache entry holds the recommendations of its own knowledge state
+    for codes, body in results:
+        assert sorted(body["student"]["known_concepts"]) == sorted(codes)
+        assert rec_codes(body["recommended_concepts"]) == rec_codes(main.preview_recommendations(codes))
+    for (_, known), recs in main.recommendation_cache.entries.items():
+        assert rec_codes(recs) == rec_codes(main.preview_recommendations(known))
+
+def test_coordinator_answers_each_waiter_for_its_own_update(app_module):
+    main = app_module
+    coordinator = main.ReasoningCoordinator(200)
+    first = coordinator.enqueue("twice", ["point"])
+    second = coordinator.enqueue("twice", ["point", "line", "segment", "ray", "angle"])
+    other = coordinator.enqueue("once", ["point", "line"])
+    assert rec_codes(first.result()) == rec_codes(main.preview_recommendations(["point"]))
+    assert rec_codes(second.result()) == rec_codes(
+        main.preview_recommendations(["point", "line", "segment", "ray", "angle"]))
+    assert rec_codes(other.result()) == rec_codes(main.preview_recommendations(["point", "line"]))
+    # One window, and the later update of the student is the one that stays
+    assert (coordinator.batches, coordinator.updates) == (1, 3)
+    assert known_codes(main, "twice") == {"point", "line", "segment", "ray", "angle"}
+
+def test_async_update_answers_with_the_state_before_its_job(app_module, client, monkeypatch):
+    main = app_module
+    main.recommendation_cache.clear()
+    start = main.start_update_job
+
+    def start_and_finish(*args):
+        job = start(*args)
+        job.future.result()
+        return job
+
+    monkeypatch.setattr(main, "start_update_job", start_and_finish)
+    r = client.post("/student/update?mode=async", json={"student_id": "async_new", "known_concepts": ["point", "line"]})
+    assert r.status_code == 202
+    body = r.json()
+    # A new student has nothing materialized yet, even when the job is already done
+    assert body["stale"] and body["recommended_concepts"] == []
+    job = client.get(f"/jobs/{body['job_id']}?wait=5").json()
+    assert job["status"] == "done"
+    assert rec_codes(job["result"]["recommended_concepts"]) == rec_codes(main.preview_recommendations(["point", "line"]))
+    assert client.get("/jobs/missing").status_code == 404
+
+def test_queued_polls_share_one_reasoner_run(app_module, monkeypatch):
+    main = app_module
+    main.update_student_in_ontology("polled", ["point", "line"], reason=False)
+    s = main.get_or_create_student("polled")
+    run, runs = main.run_reasoner, []
+
+    def slow_run(s_ind=None):
+        runs.append(s_ind)
+        time.sleep(0.2)
+        run(s_ind)
+
+    monkeypatch.setattr(main, "run_reasoner", slow_run)
+    futs = [main.reasoner_executor.submit(main.ensure_reasoned, s) for _ in range(8)]
+    for f in futs:
+        f.result()
+    assert runs == [s]
+    assert rec_codes(main.student_recommendations(s)) == rec_codes(main.preview_recommendations(["point", "line"]))
+
+def test_student_module_writes_back_rule_heads_only(app_module, tmp_path):
+    main = app_module
+    # A copy of the ontology with a domainless property no rule concludes
+    world = World()
+    extra = world.get_ontology(os.path.join(ROOT, main.ONTO_PATH)).load()
+    with extra:
+        type("hasMentor", (ObjectProperty,), {})
+    path = str(tmp_path / "extra.owl")
+    extra.save(file=path)
+
+    module = main.StudentModule(path)
+    assert [p.name for p in module.inferred_props] == ["needsToLearn"]
+
+    def fake_sync(o, **kw):
+        for scratch in o.StudentModel.instances():
+            scratch.needsToLearn = [o.search_one(hasConceptCode="segment")]
+
+    main.update_student_in_ontology("module", ["line"], reason=False)
+    s = main.get_or_create_student("module")
+    module.reason(s, sync=fake_sync)
+    assert rec_codes(main.student_recommendations(s)) == ["segment"]
+
+def test_reads_reason_only_after_abox_changes(app_module, client, monkeypatch):
+    main = app_module
+    run, runs = main.run_reasoner, []
+
+    def counting_run(s_ind=None):
+        runs.append(s_ind)
+        run(s_ind)
+
+    monkeypatch.setattr(main, "run_reasoner", counting_run)
+    main.update_student_in_ontology("gen", ["point"])
+    runs.clear()
+    for _ in range(3):
+        assert client.get("/recommend/gen").json()["stale"] is False
+    assert runs == []
+    # A change recorded without reasoning (e.g. a cache hit) is reasoned on the next read only
+    main.update_student_in_ontology("gen", ["point", "line"], reason=False)
+    first = client.get("/recommend/gen").json()
+    client.get("/recommend/gen")
+    assert len(runs) == 1
+    assert rec_codes(first["concepts"]) == rec_codes(main.preview_recommendations(["point", "line"]))
+
+def test_preview_matches_student_update(app_module, client):
+    main = app_module
+    students = len(list(main.StudentModel.instances()))
+    previews = [client.post("/recommend/preview", json={"known_concepts": codes + ["nope"]}).json()
+                for codes in random_states(20, 14)]
+    # A preview creates no student
+    assert len(list(main.StudentModel.instances())) == students
+    main.recommendation_cache.clear()
+    for i, (codes, preview) in enumerate(zip(random_states(20, 14), previews)):
+        assert preview["known_concepts"] == sorted(set(codes))
+        body = client.post("/student/update", json={"student_id": f"preview{i}", "known_concepts": codes}).json()
+        assert rec_codes(preview["recommended_concepts"]) == rec_codes(body["recommended_concepts"])
@@ -0,0 +1,46 @@
+"""
+When the saved TBox classification is reused and when it is redone.
+"""
+import json
+
+import pytest
+
+@pytest.fixture
+def snapshot(app_module, tmp_path, monkeypatch):
+    main = app_module
+    path = tmp_path / "tbox.json"
+    monkeypatch.setattr(main, "TBOX_SNAPSHOT_PATH", str(path))
+    classified = []
+
+    def classify():
+        classified.append(True)
+        return {"ontology_version": main.ONTO_VERSION, "classified_by": "hermit",
+                "superclasses": {"urn:x#A": ["urn:x#A", "urn:x#B"]}}
+
+    monkeypatch.setattr(main, "classify_tbox", classify)
+
+    def save(version, classified_by):
+        path.write_text(json.dumps({"ontology_version": version, "classified_by": classified_by,
+                                    "superclasses": {"urn:x#A": ["urn:x#A"]}}))
+    return main, save, classified
+
+@pytest.mark.parametrize("version_matches, classified_by, java, redone", [
+    (True, "hermit", True, False),
+    (True, "told", False, False),
+    # Told hierarchies are replaced once Java is there
+    (True, "told", True, True),
+    (False, "hermit", True, True),
+    (False, "told", False, True),
+])
+def test_snapshot_validity(snapshot, monkeypatch, version_matches, classified_by, java, redone):
+    main, save, classified = snapshot
+    monkeypatch.setattr(main, "java_available", lambda: java)
+    save(main.ONTO_VERSION if version_matches else "other", classified_by)
+    superclasses = main.load_tbox_snapshot()
+    assert bool(classified) == redone
+    assert superclasses == ({"A": {"A", "B"}} if redone else {"A": {"A"}})
+
+def test_missing_snapshot_is_classified_and_saved(snapshot):
+    main, _, classified = snapshot
+    assert main.load_tbox_snapshot() == {"A": {"A", "B"}}
+    assert classified and json.load(open(main.TBOX_SNAPSHOT_PATH))["classified_by"] == "hermit"